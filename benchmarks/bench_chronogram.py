@@ -0,0 +1,34 @@
+# Benchmarks of the chronogram conversions
+
+import pytest
+pytest.importorskip('pytest_benchmark')
+
+from clash_testbench import Signal
+from clash_testbench.chronogram import _compress, _uncompress, _entryToSignal, _signalToEntry
+from synthetic import bits, states
+
+def test_compress(benchmark, cycles):
+    wave = [str(b) for b in bits(cycles).tolist()]
+    compressed = benchmark(_compress, wave)
+    assert len(compressed) == cycles
+
+def test_compressData(benchmark, cycles):
+    data = states(cycles)
+    wave = ['3'] * cycles
+    compressed, _ = benchmark(_compress, wave, data)
+    assert len(compressed) == cycles
+
+def test_uncompress(benchmark, cycles):
+    wave, data = _compress(['3'] * cycles, states(cycles))
+    uncompressed, _ = benchmark(_uncompress, wave, data)
+    assert len(uncompressed) == cycles
+
+def test_signalToEntry(benchmark, cycles):
+    signal = Signal('state', states(cycles))
+    entry = benchmark(_signalToEntry, signal)
+    assert len(entry['wave']) == cycles
+
+def test_entryToSignal(benchmark, cycles):
+    entry = _signalToEntry(Signal('state', states(cycles)))
+    signal = benchmark(_entryToSignal, entry)
+    assert len(signal) == cycles
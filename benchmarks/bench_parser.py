@@ -0,0 +1,42 @@
+# Benchmarks of the sampleN output processing
+
+import pytest
+pytest.importorskip('pytest_benchmark')
+
+from clash_testbench.clashi import Clashi, _SampleNTokenizer, _OutputFilter
+from clash_testbench.decoder import decode
+from synthetic import sampleNOutput
+
+def test_sampleNParser(benchmark, cycles):
+    data = sampleNOutput(cycles)
+    # The parser doesn't use the clashi process
+    clashi = Clashi.__new__(Clashi)
+    clashi._verbose = False
+    values = benchmark(clashi._sampleNParser, data, False)
+    assert len(values[0]) == cycles
+
+def test_tokenizerArrays(benchmark, cycles):
+    data = sampleNOutput(cycles)
+    chunks = [data[i:i+(1 << 16)] for i in range(0, len(data), 1 << 16)]
+    def tokenize():
+        tokenizer = _SampleNTokenizer(False)
+        for chunk in chunks:
+            tokenizer.feed(chunk)
+        return tokenizer.arrays()
+    arrays = benchmark(tokenize)
+    assert len(arrays[0]) == cycles
+
+def test_outputFilter(benchmark, cycles):
+    raw = ' sampleN @System 1 top\r\n' + sampleNOutput(cycles) + '\r\n\x1b[?1l\x1b>clashi> '
+    chunks = [raw[i:i+(1 << 16)] for i in range(0, len(raw), 1 << 16)]
+    def run():
+        outputFilter = _OutputFilter()
+        return sum(len(outputFilter.feed(chunk)) for chunk in chunks)
+    benchmark(run)
+
+def test_decode(benchmark, cycles):
+    tokenizer = _SampleNTokenizer(False)
+    tokenizer.feed(sampleNOutput(cycles))
+    arrays = tokenizer.arrays()
+    columns = benchmark(decode, arrays)
+    assert len(columns[2]) == cycles
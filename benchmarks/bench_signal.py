@@ -0,0 +1,30 @@
+# Benchmarks of the Signal representation and checking
+
+import pytest
+pytest.importorskip('pytest_benchmark')
+
+from clash_testbench import Signal
+from clash_testbench.testbench import SignalChecker
+from synthetic import bits, states
+
+def test_signalFromInts(benchmark, cycles):
+    values = bits(cycles).tolist()
+    signal = benchmark(Signal, 'a', values)
+    assert len(signal) == cycles
+
+def test_signalFromStrings(benchmark, cycles):
+    values = states(cycles)
+    signal = benchmark(Signal, 'state', values)
+    assert len(signal) == cycles
+
+def test_signalValues(benchmark, cycles):
+    signal = Signal('state', states(cycles))
+    values = benchmark(signal.values)
+    assert len(values) == cycles
+
+def test_evalValid(benchmark, cycles):
+    expected = Signal('expected', states(cycles))
+    actual = Signal('actual', states(cycles, seed=1))
+    checker = SignalChecker(None, actual)
+    checker._expected = expected
+    benchmark(checker._evalValid)
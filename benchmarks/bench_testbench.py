@@ -0,0 +1,56 @@
+# End to end benchmarks of Testbench.run (with the fake clashi by default)
+
+import pytest
+pytest.importorskip('pytest_benchmark')
+
+from os.path import abspath, dirname, join
+
+from clash_testbench import Testbench, Signal, Stimulus, ClashiPool, runBatch
+from synthetic import bits, STATES
+
+# Number of testbenches of the batched runs (sharing the cycles)
+BATCH = 16
+
+FILE = join(dirname(dirname(abspath(__file__))), 'tests', 'function.hs')
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = ClashiPool(maxSessions=1)
+    yield pool
+    pool.close()
+
+def _testbench(cycles, pool):
+    tb = Testbench(FILE, 'top', pool=pool)
+    tb.setInputs([Signal('input', bits(cycles).tolist())])
+    tb.setExpectedOutputs([
+        Signal('bit', [i & 1 for i in range(cycles)]),
+        Signal('count', [i & 255 for i in range(cycles)]),
+        Signal('state', [STATES[i & 3] for i in range(cycles)])
+    ])
+    tb.setActualOutputsNames(['bit', 'count', 'state'])
+    return tb
+
+@pytest.mark.parametrize('stimulus', [Stimulus.LIST, Stimulus.FILE])
+def test_run(benchmark, cycles, pool, stimulus):
+    tb = _testbench(cycles, pool)
+    benchmark.pedantic(tb.run, kwargs={'seed' : 0, 'stimulus' : stimulus}, rounds=3, warmup_rounds=1)
+    assert all(checker.isValid() for checker in tb)
+
+def test_runWindowed(benchmark, cycles, pool):
+    tb = _testbench(cycles, pool)
+    benchmark.pedantic(tb.runWindowed, args=(max(1, cycles // 10),), kwargs={'seed' : 0}, rounds=3, warmup_rounds=1)
+    assert all(checker.isValid() for checker in tb)
+
+def _runEach(testbenches):
+    for tb in testbenches:
+        tb.run(seed=0)
+
+@pytest.mark.parametrize('batched', [False, True])
+def test_runBatch(benchmark, cycles, pool, batched):
+    # Many small testbenches : one command per testbench or a single one
+    testbenches = [_testbench(max(1, cycles // BATCH), pool) for _ in range(BATCH)]
+    if batched:
+        benchmark.pedantic(runBatch, args=(testbenches,), kwargs={'seed' : 0}, rounds=3, warmup_rounds=1)
+    else:
+        benchmark.pedantic(_runEach, args=(testbenches,), rounds=3, warmup_rounds=1)
+    assert all(checker.isValid() for tb in testbenches for checker in tb)
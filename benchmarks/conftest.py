@@ -0,0 +1,54 @@
+# Benchmark configuration
+#
+# The benchmarks use the fake clashi (fake_clashi.py) unless
+# CLASH_TESTBENCH_CLASHI is already set. The number of cycles of each
+# benchmark is taken from --bench-sizes or CLASH_TESTBENCH_BENCH_SIZES
+# (comma-separated), from 10^3 to 10^5 by default. --bench-large adds the
+# 10^7 tier
+
+from os import environ
+from os.path import abspath, dirname, join
+from sys import executable, path
+import shlex
+
+import pytest
+
+path.insert(0, dirname(dirname(abspath(__file__))))
+
+FAKE_CLASHI = f'{shlex.quote(executable)} {shlex.quote(join(dirname(abspath(__file__)), "fake_clashi.py"))}'
+
+DEFAULT_SIZES = '1000,10000,100000'
+# Number of cycles added by --bench-large
+LARGE_SIZE = 10**7
+
+def pytest_addoption(parser):
+    group = parser.getgroup('clash_testbench benchmarks')
+    group.addoption('--bench-sizes', default=None,
+        help=f"Number of cycles of each benchmark (comma-separated, 1e5 notation allowed), {DEFAULT_SIZES} by default")
+    group.addoption('--bench-large', action='store_true', default=False,
+        help=f"Also run the benchmarks with {LARGE_SIZE:.0e} cycles")
+
+def sizes(config) -> "list[int]":
+    option = config.getoption('bench_sizes')
+    if option is None:
+        option = environ.get('CLASH_TESTBENCH_BENCH_SIZES', DEFAULT_SIZES)
+    sizes = [int(float(s)) for s in option.split(',')]
+    if config.getoption('bench_large') and LARGE_SIZE not in sizes:
+        sizes.append(LARGE_SIZE)
+    return sizes
+
+def pytest_generate_tests(metafunc):
+    if 'cycles' in metafunc.fixturenames:
+        metafunc.parametrize('cycles', sizes(metafunc.config))
+
+@pytest.fixture(scope='session', autouse=True)
+def clashi():
+    """
+    Use the fake clashi during the benchmarks (unless another one is given)
+    """
+    previous = environ.get('CLASH_TESTBENCH_CLASHI')
+    if previous is None:
+        environ['CLASH_TESTBENCH_CLASHI'] = FAKE_CLASHI
+    yield environ['CLASH_TESTBENCH_CLASHI']
+    if previous is None:
+        del environ['CLASH_TESTBENCH_CLASHI']
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# Scripted stand-in for clashi
+#
+# Emulates the prompt and escape codes of clashi and answers the commands sent
+# by clash_testbench without simulating anything, so that the Python side can
+# be benchmarked offline. Select it with
+#   CLASH_TESTBENCH_CLASHI="python benchmarks/fake_clashi.py"
+#
+# - :l / :r                       -> module loaded
+# - sampleN @Dom N ...            -> N samples (Bit, Unsigned, state) : (0,0,Idle),(1,1,Read),...
+#                                    one list per sampleN of the line (batches of sampleNMany)
+# - <name> <- ... newIORef ...    -> windowed simulation (read with atomicModifyIORef ... splitAt K)
+# - mapM_ print [f (a),f (b),...] -> a+1, b+1, ... (one per line)
+# - f a                           -> a+1
+# - a + 1                         -> a+1 (resynchronization marker of AsyncClashi)
+# - sleep S                       -> waits S seconds (a command that can time out)
+# - anything else                 -> error
+
+import re
+import sys
+import signal
+import termios
+import time
+
+# Number of samples written at once
+CHUNK = 1 << 16
+STATES = ['Idle', 'Read', 'Write', 'Wait']
+PROMPT = '\x1b[?1l\x1b>clashi> '
+
+class Interrupt(Exception):
+    pass
+
+def _interrupt(*args):
+    raise Interrupt()
+
+def out(s):
+    sys.stdout.write(s)
+    sys.stdout.flush()
+
+def samples(start, stop):
+    """
+    Write the samples [start, stop) as a list
+    """
+    sys.stdout.write('[')
+    for i in range(start, stop, CHUNK):
+        separator = ',' if i > start else ''
+        sys.stdout.write(separator + ','.join(f'({j & 1},{j & 255},{STATES[j & 3]})' for j in range(i, min(i + CHUNK, stop))))
+    out(']\n')
+
+def main():
+    signal.signal(signal.SIGINT, _interrupt)
+    echo = sys.stdin.isatty()
+    if echo:
+        # Like haskeline, lines aren't limited by the terminal line buffer and
+        # are echoed by clashi itself (the echo of the terminal can be written
+        # after the start of the answer)
+        attributes = termios.tcgetattr(0)
+        attributes[3] &= ~(termios.ICANON | termios.ECHO | termios.ECHOCTL)
+        termios.tcsetattr(0, termios.TCSANOW, attributes)
+    if sys.argv[1:] == ['--numeric-version']:
+        out('0.0.0\n')
+        return
+    out('Clashi, fake version\n\x1b[?1h\x1b=clashi> ')
+    offset = 0
+    while True:
+        try:
+            line = sys.stdin.readline()
+            if not line:
+                break
+            if echo:
+                out(line)
+            line = line.strip()
+            sampleN = re.findall(r'sampleN @\w+ (\d+)', line)
+            window = re.search(r'atomicModifyIORef \w+ .*splitAt (\d+)', line)
+            if line.startswith(':l') or line.startswith(':r'):
+                out('Ok, one module loaded.\n')
+            elif re.match(r'\w+ <- .*newIORef', line):
+                offset = 0
+            elif 'writeIORef' in line:
+                pass
+            elif window:
+                n = int(window.group(1))
+                samples(offset, offset + n)
+                offset += n
+            elif sampleN:
+                for n in sampleN:
+                    samples(0, int(n))
+            elif line.startswith('Prelude.mapM_ Prelude.print ['):
+                out(''.join(str(int(x) + 1) + '\n' for x in re.findall(r'\w+ \((-?\d+)\)', line)))
+            elif re.fullmatch(r'sleep \d+(\.\d+)?', line):
+                time.sleep(float(line.split()[1]))
+                out('()\n')
+            elif re.fullmatch(r'-?\d+ \+ 1', line):
+                out(str(int(line.split()[0]) + 1) + '\n')
+            elif re.fullmatch(r'\w+ -?\d+', line):
+                out(str(int(line.split()[1]) + 1) + '\n')
+            elif line:
+                out('<interactive>:1:1: error: Variable not in scope\n')
+        except Interrupt:
+            out('Interrupted.\n')
+        out(PROMPT)
+
+if __name__ == '__main__':
+    main()
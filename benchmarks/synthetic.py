@@ -0,0 +1,25 @@
+# Synthetic data of the benchmarks
+
+import numpy as np
+
+STATES = ['Idle', 'Read', 'Write', 'Wait']
+
+def sampleNOutput(cycles : int) -> str:
+    """
+    sampleN output of a (Bit, Unsigned, state) testbench, like fake_clashi.py
+    """
+    return '[' + ','.join(f'({i & 1},{i & 255},{STATES[i & 3]})' for i in range(cycles)) + ']'
+
+def bits(cycles : int, seed : int = 0) -> np.ndarray:
+    """
+    Random bits, changing on average every 4 cycles
+    """
+    rng = np.random.default_rng(seed)
+    return (np.cumsum(rng.random(cycles) < 0.25) & 1).astype(np.int64)
+
+def states(cycles : int, seed : int = 0) -> "list[str]":
+    """
+    Random states, changing on average every 4 cycles
+    """
+    rng = np.random.default_rng(seed)
+    return np.array(STATES)[np.cumsum(rng.random(cycles) < 0.25) & 3].tolist()
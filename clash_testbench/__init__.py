@@ -1,6 +1,12 @@
 #from .entity import Entity
 #from ._chronogram import Chronogram
-from .chronogram import Chronogram
-from .testbench import Testbench
-from .logic import Signal
-from .function import Function
\ No newline at end of file
+from .chronogram import Chronogram, saveSVGs
+from .testbench import Testbench, Stimulus, Engine, runMany, runBatch
+from .logic import Signal, Level, Unknown
+from .function import Function, bits
+from .pool import ClashiPool, defaultPool
+from .clashi import AsyncClashi, SampleNJob
+from .cache import ResultCache
+from .compiled import CompiledClashi
+from .trace import TraceWriter, saveTrace, loadTrace, writeVCD, readVCD
+from . import profiling
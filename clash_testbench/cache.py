@@ -0,0 +1,199 @@
+# Testbench result cache
+#
+# Store the sampleN outputs of testbench runs on disk, keyed by everything
+# the outputs depend on (sources, entity, number of cycles, inputs and clash
+# version), so that unchanged testbenches don't have to be simulated again
+
+from functools import lru_cache
+from hashlib import sha256
+from os import getpid, makedirs, remove, replace, scandir, utime
+from os.path import abspath, dirname, exists, join
+from subprocess import PIPE, DEVNULL, TimeoutExpired, run
+import re
+import numpy as np
+
+from .compiled import _cacheDirectory
+from .clashi import DEFAULT_DOMAIN, _clashiCommand
+
+# Maximum size of the cache directory (bytes)
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+# Changed whenever the stored format (or the way the outputs are parsed) changes
+_FORMAT = '1'
+# Number of characters read at once when an input file is hashed
+_HASH_CHUNK = 1 << 20
+# Time given to clashi to print its version (seconds)
+_VERSION_TIMEOUT = 30
+
+_IMPORT = re.compile(r'^import\s+(?:qualified\s+)?([\w.]+)', re.MULTILINE)
+
+@lru_cache(maxsize=None)
+def _clashVersion() -> str:
+    """
+    Version of clashi ('' if it cannot be found)
+    """
+    try:
+        return run(_clashiCommand() + ['--numeric-version'], stdin=DEVNULL, stdout=PIPE, stderr=DEVNULL, encoding='utf-8', timeout=_VERSION_TIMEOUT).stdout.strip()
+    except (OSError, TimeoutExpired):
+        return ''
+
+def _sources(files : "list[str]") -> "list[str]":
+    """
+    Return the files and the local modules they import (recursively), looked up
+    relative to the directory of each file
+    """
+    found = []
+    pending = [abspath(f) for f in files]
+    while pending:
+        file = pending.pop(0)
+        if file in found:
+            continue
+        found.append(file)
+        with open(file, encoding='utf-8') as f:
+            modules = _IMPORT.findall(f.read())
+        for module in modules:
+            path = join(dirname(file), *module.split('.')) + '.hs'
+            if exists(path):
+                pending.append(path)
+    return found
+
+def _readChunks(path : str):
+    """
+    Yield the content of a text file, _HASH_CHUNK characters at a time
+    """
+    with open(path, encoding='utf-8') as f:
+        while True:
+            chunk = f.read(_HASH_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+
+class ResultCache:
+    def __init__(self, directory : str = None, maxSize : int = DEFAULT_MAX_SIZE) -> None:
+        """
+        On-disk cache of testbench outputs
+
+        Each entry holds the output columns (strings, as returned by the sampleN
+        parser) of a run. When the directory grows over maxSize, the least
+        recently used entries are removed
+
+        Parameters
+        ----------
+        directory : str
+            Cache directory, $CLASH_TESTBENCH_CACHE/results by default
+            (~/.cache/clash_testbench/results)
+        maxSize : int
+            Maximum size of the directory in bytes
+        """
+        self.directory = join(_cacheDirectory(), 'results') if directory is None else directory
+        self.maxSize = maxSize
+
+    def key(self, files, entity : str, N : int, inputs : list, singleOutput : bool, domain : str = DEFAULT_DOMAIN) -> str:
+        """
+        Return the key of a run
+
+        Parameters
+        ----------
+        files : str or list[str]
+            Source file(s), the local modules they import are included
+        entity : str
+            Name of the entity
+        N : int
+            Number of cycles
+        inputs : list
+            Values of each input signal, as a string or an iterable of strings
+            (the values as given to clashi, one per line)
+        singleOutput : bool
+            Single output (the parser doesn't split tuples)
+        domain : str
+            Clock domain of the simulation
+
+        Returns
+        -------
+        key : str
+        """
+        files = [files] if isinstance(files, str) else files
+        h = sha256()
+        def add(text):
+            h.update(text.encode('utf-8') + b'\0')
+        for part in [_FORMAT, _clashVersion(), entity, str(N), str(singleOutput)]:
+            add(part)
+        if domain != DEFAULT_DOMAIN:
+            # The keys of the System runs are unchanged
+            add(domain)
+        for source in _sources(files):
+            with open(source, 'rb') as f:
+                h.update(f.read() + b'\0')
+        for signal in inputs:
+            for chunk in ([signal] if isinstance(signal, str) else signal):
+                h.update(chunk.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def _path(self, key : str) -> str:
+        return join(self.directory, key + '.npz')
+
+    def get(self, key : str) -> "list[np.ndarray]":
+        """
+        Return the output columns stored for this key, None if there are none
+        """
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                columns = [data[f'arr_{i}'] for i in range(len(data.files))]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            # Corrupted entry
+            self._remove(path)
+            return None
+        # The modification time is used as the last use time for the eviction
+        try:
+            utime(path)
+        except OSError:
+            pass
+        return columns
+
+    def put(self, key : str, columns : "list[np.ndarray]"):
+        """
+        Store the output columns of a run and evict old entries if the cache is too big
+        """
+        makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # Written to a temporary file first so that a reader never sees an incomplete entry
+        temporary = f'{path}.{getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            np.savez_compressed(f, *[np.asarray(c, dtype=str) for c in columns])
+        replace(temporary, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in scandir(self.directory):
+            if entry.name.endswith('.npz'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.maxSize:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        """
+        Remove all the entries
+        """
+        if exists(self.directory):
+            for entry in scandir(self.directory):
+                if entry.name.endswith('.npz'):
+                    self._remove(entry.path)
@@ -1,11 +1,17 @@
 from .logic import *
+from .logic import _toPython
 import json
 import wavedrom
 import numpy as np
 from .testbench import Testbench
+from .trace import writeVCD, saveTrace
+from . import profiling
 
 from os.path import splitext, join, exists
-from os import remove
+from os import remove, replace, getpid
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+import re
 
 try:
     # TODO : Find a library that procudes valid .pdf
@@ -25,6 +31,16 @@ WD_LOGIC_HIGH = '1'
 WD_LOGIC_LOW = '0'
 WD_LOGIC_UNKNOWN = 'x'
 WD_DATA_SYMBOLS = ['2', '3', '4', '5', '6', '7', '8', '9']
+WD_DATA_GENERIC = '='
+WD_GAP = '|'
+
+# Cycles shown before and after each window given to saveSVG (mismatch ranges for instance)
+DEFAULT_MARGIN = 8
+
+# Hash of the rendered description, written at the end of the .svg files
+_SVG_HASH = re.compile(r'<!-- clash_testbench ([0-9a-f]{64}) -->\s*$')
+# Number of bytes read at the end of a .svg file to find the hash
+_SVG_HASH_TAIL = 256
 
 WD_SYMBOL_LOGIC = {
     '0': Level.LOW,
@@ -115,34 +131,97 @@ def _sampleToSymbolData(sample: Sample):
     return wave, data
 
 
+# Codes of the wave symbols (wavedrom symbols are single ASCII characters)
+_DOT = ord('.')
+_DATA_CODES = np.frombuffer(''.join(WD_DATA_SYMBOLS).encode('ascii'), dtype=np.uint8)
+_NO_DATA_CODES = np.frombuffer((WD_LOGIC_UNKNOWN + WD_LOGIC_HIGH + WD_LOGIC_LOW).encode('ascii'), dtype=np.uint8)
+# Wave symbol of each Level value
+_LEVEL_SYMBOLS = np.array([WD_LOGIC_SYMBOL[l] for l in [Level.LOW, Level.HIGH, Level.UNKNOWN]])
+_DATA_SYMBOLS = np.array(WD_DATA_SYMBOLS)
+# Symbols taking a data value when rendered
+_RENDER_DATA_CODES = np.frombuffer((''.join(WD_DATA_SYMBOLS) + WD_DATA_GENERIC).encode('ascii'), dtype=np.uint8)
+# Level and color index of each symbol code
+_INVALID = 255
+_SYMBOL_LEVELS = np.full(256, _INVALID, dtype=np.uint8)
+_SYMBOL_COLORS = np.zeros(256, dtype=np.uint8)
+for _symbol, _level in WD_SYMBOL_LOGIC.items():
+    _SYMBOL_LEVELS[ord(_symbol)] = _level.value
+for _color, _symbol in enumerate(WD_DATA_SYMBOLS):
+    _SYMBOL_LEVELS[ord(_symbol)] = DATA
+    _SYMBOL_COLORS[ord(_symbol)] = _color
+
+def _objectArray(values: list) -> np.ndarray:
+    """
+    1D object array of the values (without numpy trying to broadcast them)
+    """
+    array = np.empty(len(values), dtype=object)
+    array[:] = list(values)
+    return array
+
 def _compress(wave: list, data: list = None):
     """
     Compress a WD wave ['0', '0', '0', '1', '1', '1'] -> 0..1..
     Data (if supplied) is also compressed
     """
+    N = len(wave)
+    if N == 0:
+        return '' if data is None else ('', [])
+
+    w = np.asarray(wave, dtype=str)
+    # A new symbol is written when the wave or the data (if any) changes
+    change = np.ones(N, dtype=bool)
+    change[1:] = w[1:] != w[:-1]
+    if data is not None:
+        d = _objectArray(data)
+        change[1:] |= (d[1:] != None) & (d[1:] != d[:-1])
 
-    current_w = ''
-    current_d = ''
-    new_wave = ''
-    new_data = []
-
-    data_list = [None] * len(wave) if data is None else data
-
-    for w, d in zip(wave, data_list):
-        if w != current_w or (d != None and d != current_d):
-            new_wave += w
-            if w in WD_DATA_SYMBOLS:
-                new_data.append(d)
-        else:
-            new_wave += '.'
-        current_w = w
-        current_d = d
+    new_wave = ''.join(np.where(change, w, '.').tolist())
 
-    #print(f"{wave}, {data} -> {new_wave}, {new_data}")
     if data is None:
         return new_wave
     else:
-        return new_wave, new_data
+        return new_wave, d[change & np.isin(w, _DATA_SYMBOLS)].tolist()
+
+
+def _runs(wave: str, data: list = None):
+    """
+    Split a WD wave into runs (a symbol followed by '.')
+
+    Returns
+    -------
+    runIndex : np.ndarray
+        Run of each sample
+    symbols : np.ndarray
+        Symbol code (uint8) of each run
+    runData : np.ndarray
+        Data of each run (object, None for runs without data)
+    """
+    try:
+        codes = np.frombuffer(wave.encode('ascii'), dtype=np.uint8)
+    except UnicodeEncodeError:
+        raise ValueError(f"Couldn't parse symbols of {wave}")
+
+    isSymbol = codes != _DOT
+    if len(codes) > 0 and not isSymbol[0]:
+        raise ValueError("Signal cannot start with '.'")
+    runIndex = np.cumsum(isSymbol) - 1
+    symbols = codes[isSymbol]
+    runData = np.full(len(symbols), None, dtype=object)
+
+    if data is not None:
+        isData = np.isin(symbols, _DATA_CODES)
+        invalid = ~(isData | np.isin(symbols, _NO_DATA_CODES))
+        nData = np.count_nonzero(isData)
+        # The first error in wave order is reported : an invalid symbol or a data symbol without data
+        firstInvalid = np.argmax(invalid) if np.any(invalid) else len(symbols)
+        firstMissing = np.flatnonzero(isData)[len(data)] if nData > len(data) else len(symbols)
+        if firstInvalid < firstMissing:
+            raise ValueError(f"Couldn't parse symbol : '{chr(symbols[firstInvalid])}'")
+        if firstMissing < len(symbols):
+            raise ValueError(f"Mismatch in wave and data length : {wave}, {data}")
+        runData[isData] = _objectArray(data[:nData])
+
+    return runIndex, symbols, runData
 
 
 def _uncompress(wave: str, data: list = None):
@@ -153,33 +232,11 @@ def _uncompress(wave: str, data: list = None):
     '3.x3' + ['A', 'B'] -> '33x3' + ['A', 'A', None, 'B']
     Data (if supplied) is also uncompressed
     """
-    new_wave = []
-    new_data = []
+    runIndex, symbols, runData = _runs(wave, data)
 
-    if data is not None:
-        data_iter = iter(data)
-
-    #data_list = [None] * len(wave) if data is None else data
-    for i, w in enumerate(wave):
-        if w == '.':
-            if i == 0:
-                raise ValueError("Signal cannot start with '.'")
-            new_wave.append(new_wave[-1])
-            new_data.append(new_data[-1])
-        else:
-            new_wave.append(w)
-            if (w == 'x') or (data is None) or (w in [WD_LOGIC_HIGH, WD_LOGIC_LOW]):
-                new_data.append(None)
-            elif w in WD_DATA_SYMBOLS:
-                # This is a data frame
-                try:
-                    new_data.append(next(data_iter))
-                except StopIteration:
-                    raise ValueError(f"Mismatch in wave and data length : {wave}, {data}")
-            else:
-                raise ValueError(f"Couldn't parse symbol : '{w}'")
+    new_wave = list(symbols[runIndex].tobytes().decode('ascii'))
+    new_data = runData[runIndex].tolist()
 
-    
     return new_wave, new_data
 
 
@@ -205,14 +262,26 @@ def _entryToSignal(entry: dict):
 
     data, wave, name = entry.get(WD_KEY_DATA), entry.get(
         WD_KEY_WAVE), entry.get(WD_KEY_NAME)
-    # 2) Uncompress the signal (remove the '.')
-    uwave, udata = _uncompress(wave, data)
-
-    # 3) Create the signal
+    # 2) Split the wave into runs (a sample per run)
+    runIndex, symbols, runData = _runs(wave, data)
+
+    # 3) Level, data and color of each run
+    levels = _SYMBOL_LEVELS[symbols]
+    isData = levels == DATA
+    # Data symbols without data are reported before invalid symbols
+    missing = isData & (runData == None)
+    if np.any(missing):
+        raise ValueError(f"Sample's symbol '{chr(symbols[np.argmax(missing)])}' cannot be linked with None data")
+    if np.any(levels == _INVALID):
+        raise ValueError(f"Couldn't parse symbol : '{chr(symbols[np.argmax(levels == _INVALID)])}'")
+    # The data values are checked and converted by a signal of the data runs only
+    dataSignal = Signal(name, runData[isData].tolist())
+    values = np.zeros(len(symbols), dtype=dataSignal._data.dtype)
+    values[isData] = dataSignal._data
+
+    # 4) Repeat the runs
     signal = Signal(name)
-
-    for w, d in zip(uwave, udata):
-        signal += _symbolDataToSample(w, d)
+    signal._setArrays(levels[runIndex], values[runIndex], _SYMBOL_COLORS[symbols][runIndex])
 
     return signal
 
@@ -232,18 +301,170 @@ def _signalToEntry(signal: Signal) -> dict:
     entry = {}
     # 1) Set the name
     entry[WD_KEY_NAME] = signal.name
-    uwave, udata = [], []
 
-    # 2) Add the samples
+    # 2) Symbol of each sample : logic levels ('0' / '1' strings included) or data (by color)
+    levels = signal._levels
+    values = signal._data if signal._categories is None else signal._categories[signal._data]
+    isData = levels == DATA
+    symbols = np.where(isData, _DATA_SYMBOLS[signal._colors], _LEVEL_SYMBOLS[np.minimum(levels, len(_LEVEL_SYMBOLS) - 1)])
+    if values.dtype.kind in 'UO':
+        for logic in [WD_LOGIC_LOW, WD_LOGIC_HIGH]:
+            isLogic = isData & (values == logic)
+            symbols[isLogic] = logic
+            isData &= ~isLogic
+
+    # 3) Compress : a new symbol is written when the symbol or the data changes
+    N = len(levels)
+    change = np.ones(N, dtype=bool)
+    if N > 0:
+        change[1:] = symbols[1:] != symbols[:-1]
+        keys = signal._data if signal._categories is not None else values
+        change[1:] |= isData[1:] & ((keys[1:] != keys[:-1]) | ~isData[:-1])
+
+    entry[WD_KEY_WAVE] = ''.join(np.where(change, symbols, '.').tolist())
+    entry[WD_KEY_DATA] = [_toPython(v) for v in values[change & isData].tolist()]
 
-    for sample in signal:
-        w, d = _sampleToSymbolData(sample)
-        uwave.append(w)
-        udata.append(d)
+    return entry
 
-    entry[WD_KEY_WAVE], entry[WD_KEY_DATA] = _compress(uwave, udata)
 
-    return entry
+def _selectEntry(entry: dict, cycles: np.ndarray, starts: np.ndarray) -> dict:
+    """
+    Return a copy of an entry showing only some cycles
+
+    Parameters
+    ----------
+    entry : dict
+    cycles : np.ndarray
+        Cycle shown in each column, -1 for a gap column ('|')
+    starts : np.ndarray
+        Columns where a window starts (the symbol and data are written again)
+
+    Returns
+    -------
+    entry : dict
+    """
+    wave = entry[WD_KEY_WAVE]
+    data = entry.get(WD_KEY_DATA)
+    if isinstance(data, str):
+        data = data.split()
+    codes = np.frombuffer(wave.encode('ascii'), dtype=np.uint8)
+    N = len(codes)
+    # Columns after the end of this wave are dropped
+    inside = np.flatnonzero((cycles >= 0) & (cycles < N))
+    end = inside[-1] + 1 if len(inside) > 0 else 0
+    cycles, starts = cycles[:end], starts[:end]
+
+    isSymbol = codes != _DOT
+    if N > 0 and not isSymbol[0]:
+        raise ValueError("Signal cannot start with '.'")
+    runIndex = np.cumsum(isSymbol) - 1
+    symbols = codes[isSymbol]
+    isDataRun = np.isin(symbols, _RENDER_DATA_CODES)
+    dataIndex = np.cumsum(isDataRun) - 1
+
+    gap = cycles < 0
+    runs = runIndex[np.where(gap, 0, cycles)]
+    change = starts.copy()
+    change[1:] |= runs[1:] != runs[:-1]
+    change &= ~gap
+    new_codes = np.where(change, symbols[runs], _DOT).astype(np.uint8)
+    new_codes[gap] = ord(WD_GAP)
+
+    new_entry = dict(entry)
+    new_entry[WD_KEY_WAVE] = new_codes.tobytes().decode('ascii')
+    if data is not None:
+        indices = dataIndex[runs[change & isDataRun[runs]]]
+        if len(indices) > 0 and indices[-1] >= len(data):
+            raise ValueError(f"Mismatch in wave and data length : {wave}, {data}")
+        new_entry[WD_KEY_DATA] = [data[i] for i in indices.tolist()]
+    return new_entry
+
+def _mapEntries(item, function):
+    """
+    Apply a function to all the entries with a wave (the groups and their headers are kept)
+    """
+    if isinstance(item, list):
+        return [_mapEntries(e, function) for e in item]
+    if isinstance(item, dict) and WD_KEY_WAVE in item:
+        return function(item)
+    return item
+
+def _contentHash(content: dict) -> str:
+    return sha256(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def _svgHash(file: str) -> str:
+    """
+    Return the hash written in a .svg file (None if there is none)
+    """
+    try:
+        with open(file, 'rb') as f:
+            f.seek(0, 2)
+            f.seek(max(f.tell() - _SVG_HASH_TAIL, 0))
+            tail = f.read().decode('utf-8', errors='replace')
+    except OSError:
+        return None
+    match = _SVG_HASH.search(tail)
+    return None if match is None else match.group(1)
+
+def _renderSVG(content: dict, output_file: str, digest: str):
+    """
+    Render a WD description to a .svg file, followed by the hash of the description
+    """
+    with profiling.timer('chronogram.render'):
+        svg = wavedrom.render(str(content))
+        # Written to a temporary file first so that a reader never sees an incomplete file
+        temporary = f'{output_file}.{getpid()}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            svg.write(f)
+            f.write(f'\n<!-- clash_testbench {digest} -->\n')
+        replace(temporary, output_file)
+
+def saveSVGs(chronograms: list, output_files: "list[str]" = None, processes: int = None, force: bool = False, **options) -> "list[str]":
+    """
+    Save multiple chronograms as .svg files, rendered in parallel
+
+    The hash of the description is written in each file, chronograms whose
+    file already holds the same description aren't rendered again
+
+    Parameters
+    ----------
+    chronograms : list[Chronogram]
+    output_files : list[str]
+        Output file paths, next to the chronogram files by default (see Chronogram.saveSVG)
+    processes : int
+        Number of rendering processes, the number of CPUs by default
+    force : bool
+        Render all the chronograms, even the unchanged ones
+    options
+        Rendering options given to each chronogram (window, windows, margin, overview)
+
+    Returns
+    -------
+    rendered : list[str]
+        Files that have been rendered
+    """
+    if output_files is None:
+        output_files = [None] * len(chronograms)
+    if len(output_files) != len(chronograms):
+        raise ValueError(f"Mismatch in chronograms and output files length : {len(chronograms)}, {len(output_files)}")
+
+    jobs = []
+    for chronogram, output_file in zip(chronograms, output_files):
+        output_file = chronogram._svgFile(output_file)
+        content = chronogram._renderedContent(**options)
+        digest = _contentHash(content)
+        if force or _svgHash(output_file) != digest:
+            jobs.append((content, output_file, digest))
+
+    if len(jobs) == 1 or processes == 1:
+        for job in jobs:
+            _renderSVG(*job)
+    elif jobs:
+        with ProcessPoolExecutor(processes) as executor:
+            # Wait for all of them (and raise the first error)
+            list(executor.map(_renderSVG, *zip(*jobs)))
+
+    return [output_file for _, output_file, _ in jobs]
 
 
 def _listWDEntries(entry, remove_first=False, branch=[]):
@@ -285,6 +506,14 @@ class Chronogram:
             self._json_content = {}
             self._json_content[WD_KEY_MAIN] = []
 
+        # Signals decoded so far : {name : signal}, an entry is only decoded
+        # when its signal is accessed. The signal is kept until the entry changes
+        self._signals = {}
+        # Signals the entries were last encoded from : {name : (signal, version)}
+        self._encoded = {}
+        # Entries modified since the templates were last applied
+        self._dirty = set()
+
         # List all of the entries and create a tree of their position based on their names
         #  note : no two entries can have the same name
         self._updateEntriesTree()
@@ -293,6 +522,10 @@ class Chronogram:
         
 
     def _updateEntriesTree(self):
+        """
+        Build the tree of the entries (name -> branch) from the WD description.
+        It is then kept up to date by the methods adding, replacing and removing entries
+        """
         entries = _listWDEntries(self._json_content[WD_KEY_MAIN])
         self._entriesTree = {}
         for branch, entry in entries:
@@ -310,7 +543,34 @@ class Chronogram:
                     # This entry is ignored
                     raise ValueError(f"Entry {entry} does not have a name")
 
-        self._signals = self.getSignals()
+        self._signals = {}
+        self._encoded = {}
+        self._dirty = set(self._entriesTree)
+
+    def _getSignal(self, name: str) -> Signal:
+        """
+        Return the signal of an entry, decoded on first access
+
+        Parameters
+        ----------
+        name : str
+
+        Returns
+        -------
+        signal : Signal
+        """
+        signal = self._signals.get(name)
+        if signal is None:
+            signal = _entryToSignal(self._WDGetEntry(self._entriesTree[name]))
+            self._signals[name] = signal
+        return signal
+
+    def _invalidate(self, name: str):
+        """
+        Forget the decoded signal of an entry (after it has been modified)
+        """
+        self._signals.pop(name, None)
+        self._encoded.pop(name, None)
 
     def _WDGetEntry(self, branch: list) -> dict:
         """
@@ -347,8 +607,17 @@ class Chronogram:
             # Go into the branch but to keep the last one for mutability
             top = top[b]
 
+        name = top[branch[-1]].get(WD_KEY_NAME)
         top[branch[-1]] = entry
 
+        self._invalidate(name)
+        self._dirty.add(name)
+        if entry.get(WD_KEY_NAME) != name:
+            # The entry is renamed
+            del self._entriesTree[name]
+            self._dirty.discard(name)
+            self._addToTree(entry, branch)
+
     def _WDAddEntry(self, entry: dict):
         """
         Add an entry to the list of entries
@@ -357,7 +626,38 @@ class Chronogram:
         ----------
         entry : dict
         """
-        self._json_content[WD_KEY_MAIN].append(entry)
+        main = self._json_content[WD_KEY_MAIN]
+        self._addToTree(entry, [len(main)])
+        main.append(entry)
+
+    def _WDRemoveEntry(self, name: str):
+        """
+        Remove an entry from the WD description
+
+        Parameters
+        ----------
+        name : str
+        """
+        branch = self._entriesTree.pop(name)
+        parent, index = branch[:-1], branch[-1]
+        del self._WDGetEntry(parent)[index]
+        # The following entries of the same list move back by one
+        depth = len(parent)
+        for b in self._entriesTree.values():
+            if len(b) > depth and b[depth] > index and b[:depth] == parent:
+                b[depth] -= 1
+
+        self._invalidate(name)
+        self._dirty.discard(name)
+
+    def _addToTree(self, entry: dict, branch: list):
+        name = entry.get(WD_KEY_NAME)
+        if name is None:
+            raise ValueError(f"Entry {entry} does not have a name")
+        if name in self._entriesTree:
+            raise ValueError(f"Duplicate of name {name}")
+        self._entriesTree[name] = branch
+        self._dirty.add(name)
 
     def getSignals(self, names: "list[str]" = None) -> dict:
         """
@@ -379,14 +679,13 @@ class Chronogram:
             for name, branch in self._entriesTree.items():
                 entry = self._WDGetEntry(branch)
                 if WD_KEY_WAVE in entry and not _isClock(entry):
-                    output[name] = _entryToSignal(entry)
+                    output[name] = self._getSignal(name)
         else:
             for n in names:
                 if n not in self._entriesTree:
                     raise ValueError(
                         f"name {n} doesn't exist inside this chronogram")
-                entry = self._WDGetEntry(self._entriesTree[n])
-                output[n] = _entryToSignal(entry)
+                output[n] = self._getSignal(n)
 
         return output
 
@@ -411,6 +710,9 @@ class Chronogram:
             raise TypeError("Input must be a list or dict of Signal")
 
         for signal in signals:
+            if self._encoded.get(signal.name) == (signal, signal._version) and signal.name in self._entriesTree:
+                # The entry already holds this signal
+                continue
             if signal.name in self._entriesTree:
                 # Edit the entry
                 self._WDSetEntry(_signalToEntry(signal),
@@ -418,6 +720,7 @@ class Chronogram:
             else:
                 # Create a new one
                 self._WDAddEntry(_signalToEntry(signal))
+            self._encoded[signal.name] = (signal, signal._version)
 
     def _applyTemplate(self, entry: dict, entry_template: dict) -> dict:
         """
@@ -494,20 +797,23 @@ class Chronogram:
             in the form {signal_name : template_name, ...}
         """
         self._templates = templates
+        self._dirty.update(templates)
 
     def _applyTemplates(self):
         """
-        Apply templates to all the signals
+        Apply templates to the signals modified (or whose template was modified)
+        since the templates were last applied
         """
         if self._templates is not None:
             for _name, branch in self._entriesTree.items():
-                if _name in self._templates:
+                if _name in self._templates and (_name in self._dirty or self._templates[_name] in self._dirty):
                     # This entry needs to be updated
                     template = self._WDGetEntry(
                         self._entriesTree[self._templates[_name]])
-                    entry = self._WDGetEntry(self._entriesTree[_name])
+                    entry = self._WDGetEntry(branch)
                     self._WDSetEntry(self._applyTemplate(
                         entry, template), branch)
+        self._dirty = set()
 
     def loadTestbench(self, tb : Testbench):
         """
@@ -528,31 +834,134 @@ class Chronogram:
         output_file : str
             Output file path
         """
-        self._updateEntriesTree()
         self._applyTemplates()
 
         with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(self._json_content, f, indent=2)
 
-    def saveSVG(self, output_file: str = None):
+    def _columns(self, window: tuple = None, windows: list = None, margin: int = DEFAULT_MARGIN, overview: int = None):
+        """
+        Return the cycles shown by the rendering (see saveSVG)
+
+        Returns
+        -------
+        cycles : np.ndarray
+            Cycle shown in each column, -1 for a gap column
+        starts : np.ndarray
+            Columns where a window starts
+        """
+        if window is not None and windows is not None:
+            raise ValueError("window and windows cannot be used together")
+        entries = [self._WDGetEntry(branch) for branch in self._entriesTree.values()]
+        entries = [e for e in entries if WD_KEY_WAVE in e]
+        N = max((len(e[WD_KEY_WAVE]) for e in entries), default=0)
+
+        if window is None and windows is None:
+            shown = np.ones(N, dtype=bool)
+        else:
+            shown = np.zeros(N, dtype=bool)
+            if window is not None:
+                start, stop = window
+                shown[max(start, 0):stop] = True
+            else:
+                for start, stop in windows:
+                    shown[max(start - margin, 0):stop + margin] = True
+
+        if overview is not None:
+            if overview < 1:
+                raise ValueError("overview must be at least 1")
+            # Cycles where a signal changes (a repeated logic symbol, 'xxx' for instance, doesn't)
+            changes = np.zeros(N, dtype=bool)
+            changes[:1] = True
+            for e in entries:
+                codes = np.frombuffer(e[WD_KEY_WAVE].encode('ascii'), dtype=np.uint8)
+                change = codes != _DOT
+                symbols = codes[change][np.cumsum(change) - 1]
+                change[1:] &= (symbols[1:] != symbols[:-1]) | np.isin(codes[1:], _RENDER_DATA_CODES)
+                changes[:len(codes)] |= change
+            cycle = np.arange(N)
+            lastChange = np.maximum.accumulate(np.where(changes, cycle, 0))
+            # Only the first cycles of the stable runs are kept
+            shown &= cycle - lastChange < overview
+
+        kept = np.flatnonzero(shown)
+        newWindow = np.ones(len(kept), dtype=bool)
+        newWindow[1:] = np.diff(kept) != 1
+        # A gap column is inserted before each window (except the first one)
+        gaps = np.flatnonzero(newWindow[1:]) + 1
+        cycles = np.insert(kept, gaps, -1)
+        starts = np.insert(newWindow, gaps, False)
+        return cycles, starts
+
+    def saveVCD(self, output_file: str):
+        """
+        Save the signals of the chronogram to a VCD file (the clocks aren't saved)
+
+        Parameters
+        ----------
+        output_file : str
+            Output file path
+        """
+        writeVCD(output_file, self.getSignals())
+
+    def saveTrace(self, directory: str):
+        """
+        Save the signals of the chronogram to a binary trace directory (see trace.loadTrace)
+
+        Parameters
+        ----------
+        directory : str
+        """
+        saveTrace(directory, self.getSignals())
+
+    def saveSVG(self, output_file: str = None, window: tuple = None, windows: list = None,
+            margin: int = DEFAULT_MARGIN, overview: int = None):
         """
         Save the chronogram as a .svg file
 
+        For long traces, only part of the cycles can be rendered. The windows
+        are separated by a gap ('|') and the symbols and data are written again
+        at the beginning of each window
+
         Parameters
         ----------
         output_file : str
             Output file path
+        window : tuple
+            (start, stop) cycles rendered, stop is excluded. All the cycles are
+            rendered if window and windows are None
+        windows : list[tuple]
+            (start, stop) of multiple windows (the mismatch ranges of a
+            SignalChecker for instance), each one is widened by margin cycles
+        margin : int
+            Cycles added before and after each window of windows
+        overview : int
+            Collapse the stable parts : when no signal changes for more than
+            overview cycles, the following cycles are replaced by a gap
         """
+        output_file = self._svgFile(output_file)
+        content = self._renderedContent(window, windows, margin, overview)
+        _renderSVG(content, output_file, _contentHash(content))
+
+    def _svgFile(self, output_file: str = None) -> str:
         if output_file is None:
             if self._file is None:
                 raise ValueError("Cannot determine output file name, please provide one")
             output_file = splitext(self._file)[0] + '.svg'
+        return output_file
 
-        self._updateEntriesTree()
+    def _renderedContent(self, window: tuple = None, windows: list = None, margin: int = DEFAULT_MARGIN, overview: int = None) -> dict:
+        """
+        Return the WD description that is rendered (see saveSVG)
+        """
         self._applyTemplates()
 
-        svg = wavedrom.render(str(self._json_content))
-        svg.saveas(output_file)
+        content = self._json_content
+        if window is not None or windows is not None or overview is not None:
+            cycles, starts = self._columns(window, windows, margin, overview)
+            content = dict(content)
+            content[WD_KEY_MAIN] = _mapEntries(content[WD_KEY_MAIN], lambda e: _selectEntry(e, cycles, starts))
+        return content
 
     def savePDF(self, output_file: str = None):
         """
@@ -588,20 +997,32 @@ class Chronogram:
 
     
     def __getitem__(self, key):
-        return self._signals[key]
+        if key not in self._entriesTree:
+            raise KeyError(key)
+        entry = self._WDGetEntry(self._entriesTree[key])
+        if WD_KEY_WAVE not in entry or _isClock(entry):
+            # Clocks aren't signals
+            raise KeyError(key)
+        return self._getSignal(key)
 
     def __setitem__(self, key, value : Signal):
         if not isinstance(value, Signal):
             raise TypeError(f"Cannot assign value of type '{type(value)}'")
         value.name = key
         if isinstance(key, str):
-            # Apply the template to the new entry
-            branch = self._entriesTree[value.name]
-            old_entry = self._WDGetEntry(branch)
-            new_entry = _signalToEntry(value)
-            new_entry_t = self._applyTemplate(new_entry, old_entry)
-            self._WDSetEntry(new_entry_t, branch)
-
-            self._updateEntriesTree()
+            if key in self._entriesTree:
+                # Apply the template to the new entry
+                branch = self._entriesTree[value.name]
+                old_entry = self._WDGetEntry(branch)
+                new_entry = _signalToEntry(value)
+                new_entry_t = self._applyTemplate(new_entry, old_entry)
+                self._WDSetEntry(new_entry_t, branch)
+            else:
+                self._WDAddEntry(_signalToEntry(value))
         else:
-            raise KeyError(f"Unsupported key : '{key}'")
\ No newline at end of file
+            raise KeyError(f"Unsupported key : '{key}'")
+
+    def __delitem__(self, key):
+        if key not in self._entriesTree:
+            raise KeyError(key)
+        self._WDRemoveEntry(key)
\ No newline at end of file
@@ -4,29 +4,409 @@
 
 #from subprocess import Popen, PIPE, call
 #import pexpect
+
+from . import profiling
 from subprocess import PIPE, Popen, TimeoutExpired
+from os import environ
+from os.path import exists, getmtime
+from random import randrange
+import asyncio
 import re
+import shlex
 import numpy as np
 
 import pexpect
 
 _PROMPT = "clashi>"
+# Number of characters read at once when the output is streamed
+_CHUNK_SIZE = 1 << 16
+_ERROR_MARKERS = ['error:', 'Exception:']
+# Number of characters kept before an error when the output is streamed
+_ERROR_CONTEXT = 1024
+# Escape sequences removed from the output, '\x1b>' (sent by clashi after each output) is replaced by a line break
+_OUTPUT_ESCAPE = re.compile(r'\x1B(?:>|[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+# Characters that change the state of the sampleN tokenizer
+_SAMPLEN_STRUCTURE = re.compile(r'[(),\]]')
+# Consecutive samples that are flat tuples / single values (each one followed by a comma)
+_SAMPLEN_TUPLE_RUN = re.compile(r'(?:\([^()\[\]]*\),)+')
+_SAMPLEN_SCALAR_RUN = re.compile(r'(?:[^()\[\],]+,)+')
+# Time given to clashi to come back to the prompt after an interrupted command
+_RESYNC_TIMEOUT = 10
+# GHCi variable (IORef) holding the samples that haven't been read yet during a windowed simulation
+_SIMULATION = 'clashTestbenchSimulation'
+# Clock domain of the simulations when none is given
+DEFAULT_DOMAIN = 'System'
+def _clashiCommand() -> "list[str]":
+    """
+    Command starting clashi, $CLASH_TESTBENCH_CLASHI (clashi by default)
+    """
+    return shlex.split(environ.get('CLASH_TESTBENCH_CLASHI', 'clashi'))
+
+def _haskellString(s : str) -> str:
+    """
+    Return a Haskell string literal
+    """
+    return '"' + s.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _readInputsCommand(sampler : str, entity : str, files : "list[str]", result : str = 'Prelude.return') -> str:
+    """
+    Return an IO expression applying the sampler (sampleN @Dom N for example)
+    on the entity, with each input signal read from a file. The sampled list is
+    given to result (an IO action)
+
+    Qualified Prelude names are used because Clash.Prelude replaces some of them (map)
+    """
+    binds = ' '.join(f'i{i} <- Prelude.readFile {_haskellString(f)};' for i, f in enumerate(files))
+    inputs = ' '.join(f'(fromList (Prelude.map Prelude.read (Prelude.lines i{i})))' for i in range(len(files)))
+    return f'do {{ {binds} {result} ({sampler} ({entity} {inputs})) }}'
+
+class _SampleNTokenizer:
+    def __init__(self, singleValue : bool) -> None:
+        """
+        Incremental sampleN output parser, the output can be given in chunks of any size
+        (see Clashi._sampleNParser for the format). Each value is stored in its
+        own column, the raw output is never kept
+
+        Parameters
+        ----------
+        singleValue : bool
+            Tells the parser there's only one output value (that may be a tuple)
+        """
+        self._singleValue = singleValue
+        self._started = False
+        self._done = False
+        self._level = 0
+        # Pieces of the current token
+        self._parts = []
+        # Tokens of the current sample
+        self._row = []
+        self._columns = []
+        self._samples = 0
+
+    def _endToken(self):
+        self._row.append(''.join(self._parts))
+        self._parts = []
+
+    def _addRows(self, rows):
+        """
+        Add complete samples, rows is a list of samples, each one being a list of tokens
+        """
+        for r in rows:
+            self._row = r
+            self._parts = [r.pop()]
+            self._endSample()
+
+    def _addFlat(self, tokens, nSamples):
+        """
+        Add complete samples given as a flat list of tokens (sample by sample)
+
+        Returns
+        -------
+        output : bool
+            False if the samples don't all have the same number of values as the previous ones
+        """
+        if len(self._columns) == 0:
+            self._columns = [[] for _ in range(len(tokens) // nSamples)]
+        n = len(self._columns)
+        if len(tokens) != n * nSamples:
+            return False
+        for i, column in enumerate(self._columns):
+            column.extend(tokens[i::n])
+        self._samples += nSamples
+        return True
+
+    def _endSample(self):
+        self._endToken()
+        for i, token in enumerate(self._row):
+            if i == len(self._columns):
+                # New value, the previous samples didn't have it
+                self._columns.append([''] * self._samples)
+            self._columns[i].append(token)
+        for column in self._columns[len(self._row):]:
+            column.append('')
+        self._samples += 1
+        self._row = []
+
+    def _feedRun(self, chunk, pos):
+        """
+        Parse a run of simple samples (without nested parentheses) at once
+
+        Returns
+        -------
+        pos : int
+            Position after the run
+        """
+        m = _SAMPLEN_TUPLE_RUN.match(chunk, pos)
+        if m is not None:
+            run = chunk[m.start() + 1:m.end() - 2]
+            if self._singleValue:
+                samples = run.split('),(')
+                if not self._addFlat([f'({x})' for x in samples], len(samples)):
+                    self._addRows([[f'({x})'] for x in samples])
+            elif not self._addFlat(run.replace('),(', ',').split(','), run.count('),(') + 1):
+                self._addRows([x.split(',') for x in run.split('),(')])
+            return m.end()
+        m = _SAMPLEN_SCALAR_RUN.match(chunk, pos)
+        if m is not None:
+            samples = chunk[m.start():m.end() - 1].split(',')
+            if not self._addFlat(samples, len(samples)):
+                self._addRows([[x] for x in samples])
+            return m.end()
+        return pos
+
+    def feed(self, chunk : str) -> int:
+        """
+        Parse a chunk of output
+
+        Parameters
+        ----------
+        chunk : str
+
+        Returns
+        -------
+        used : int
+            Number of characters of the chunk that were parsed, the characters
+            after the end of the list are left (for the next list, see _SampleNDemux)
+        """
+        if self._done:
+            return 0
+        pos = 0
+        if not self._started:
+            # Skip everything before the list
+            pos = chunk.find('[')
+            if pos == -1:
+                return len(chunk)
+            pos += 1
+            self._started = True
+
+        while True:
+            if self._level == 0 and not self._parts and not self._row:
+                # At the start of a sample
+                pos = self._feedRun(chunk, pos)
+
+            m = _SAMPLEN_STRUCTURE.search(chunk, pos)
+            if m is None:
+                break
+            i = m.start()
+            parts = self._parts
+            if i > pos:
+                parts.append(chunk[pos:i])
+            pos = i + 1
+            d = chunk[i]
+            if d == '(':
+                self._level += 1
+                if self._level > 1 or self._singleValue:
+                    parts.append(d)
+            elif d == ')':
+                self._level -= 1
+                if self._level > 0 or self._singleValue:
+                    parts.append(d)
+            elif d == ',':
+                if self._level == 0:
+                    self._endSample()
+                elif self._level == 1 and not self._singleValue:
+                    self._endToken()
+                else:
+                    parts.append(d)
+            elif self._level == 0:
+                # End of the list
+                self._endSample()
+                self._done = True
+                return pos
+            else:
+                parts.append(d)
+
+        if pos < len(chunk):
+            self._parts.append(chunk[pos:])
+        return len(chunk)
+
+    def close(self) -> "list[list[str]]":
+        """
+        Return the values (one list per output value)
+        """
+        if not self._started:
+            raise ValueError("Couldn't find a list in the sampleN output")
+        if not self._done:
+            raise ValueError("The sampleN output ended before the end of the list")
+        return self._columns
+
+    @profiling.timed('parse.arrays')
+    def arrays(self) -> "list[np.ndarray]":
+        """
+        Return the values as arrays of strings (one array per output value)
+        """
+        return [np.array(c) for c in self.close()]
+
+
+class _SampleNDemux:
+    def __init__(self, singleValues : "list[bool]") -> None:
+        """
+        Incremental parser of several sampleN outputs printed one after the other
+        (see Clashi.sampleNMany), each list is given to its own _SampleNTokenizer
+
+        Parameters
+        ----------
+        singleValues : list[bool]
+            singleValue of each list (see _SampleNTokenizer)
+        """
+        self._tokenizers = [_SampleNTokenizer(s) for s in singleValues]
+        self._current = 0
+
+    def feed(self, chunk : str):
+        """
+        Parse a chunk of output, the rest of the chunk is given to the next
+        tokenizer when a list ends
+        """
+        while chunk and self._current < len(self._tokenizers):
+            tokenizer = self._tokenizers[self._current]
+            used = tokenizer.feed(chunk)
+            if not tokenizer._done:
+                break
+            self._current += 1
+            chunk = chunk[used:]
+
+    @profiling.timed('parse.arrays')
+    def arrays(self) -> "list[list[np.ndarray]]":
+        """
+        Return the values of each list (see _SampleNTokenizer.arrays)
+        """
+        return [[np.array(c) for c in t.close()] for t in self._tokenizers]
+
+class SampleNJob:
+    def __init__(self, N : int, entity : str, inputs : str = '', singleOutput : bool = False, domain : str = DEFAULT_DOMAIN, files : "list[str]" = None) -> None:
+        """
+        sampleN simulation run with other ones in a single clashi command (see Clashi.sampleNMany)
+
+        Parameters
+        ----------
+        N : int
+            Number of samples to simulate
+        entity : str
+            Name of the entity
+        inputs : str
+            Input signals (as in Clashi.sampleN), ignored if files is given
+        singleOutput : bool
+            Tells the parser there's only one output, and treat any tuple at a single value
+        domain : str
+            Clock domain of the simulation (System by default), other domains
+            must be defined in the loaded file (createDomain)
+        files : list[str]
+            One file per input signal (as in Clashi.sampleNFromFiles)
+        """
+        self.N = N
+        self.entity = entity
+        self.inputs = inputs
+        self.singleOutput = singleOutput
+        self.domain = domain
+        self.files = files
+
+    def _command(self) -> str:
+        """
+        IO action printing the sampled list
+        """
+        sampler = f'sampleN @{self.domain} {self.N}'
+        if self.files is not None:
+            return _readInputsCommand(sampler, self.entity, self.files, 'Prelude.print')
+        return f'Prelude.print ({sampler} ({self.entity} {self.inputs}))'
+
+    def __repr__(self) -> str:
+        return f"SampleNJob({self.entity} @{self.domain}, N = {self.N})"
+
+def _replaceEscape(match):
+    return '\n' if match.group() == '\x1b>' else ''
+
+class _OutputFilter:
+    def __init__(self) -> None:
+        """
+        Filter of the raw output of a command, fed chunk by chunk as it arrives
+
+        Each chunk goes through a single pass : the echo of the command is
+        skipped, the escape codes are removed (an incomplete escape sequence at the
+        end of a chunk is kept for the next one), the prompt ends the output and
+        the error markers are searched in the new text (and the end of the previous one)
+        """
+        # Raw text that may contain an incomplete escape sequence
+        self._carry = ''
+        # End of the filtered output that may be the start of the prompt
+        self._tail = ''
+        # End of the previous output, kept to detect markers split between two
+        # chunks and to give some context in the error message
+        self._context = ''
+        self._echo = True
+        # The prompt has been found
+        self.done = False
+        # Output from the first error marker on (None if there is no error)
+        self.error = None
+
+    def feed(self, raw : str) -> str:
+        """
+        Filter a chunk of raw output
+
+        Returns
+        -------
+        output : str
+            Filtered output ('' once an error has been found)
+        """
+        text = self._carry + raw
+        # Keep a trailing escape sequence for the next chunk if it isn't complete yet
+        i = text.rfind('\x1b')
+        if i != -1 and not _OUTPUT_ESCAPE.match(text, i):
+            text, self._carry = text[:i], text[i:]
+        else:
+            self._carry = ''
+        if '\x1b' in text:
+            text = _OUTPUT_ESCAPE.sub(_replaceEscape, text)
+
+        if self._echo:
+            # Skip the echo of the command
+            i = text.find('\n')
+            if i == -1:
+                return ''
+            text = text[i+1:]
+            self._echo = False
+
+        window = self._tail + text
+        prompt = window.find(_PROMPT)
+        if prompt != -1:
+            body, self._tail = window[:prompt], ''
+            self.done = True
+        else:
+            keep = min(len(window), len(_PROMPT) - 1)
+            body, self._tail = window[:len(window) - keep], window[len(window) - keep:]
+
+        if self.error is not None:
+            self.error.append(body)
+            return ''
+        checked = self._context + body
+        if any(marker in checked for marker in _ERROR_MARKERS):
+            self.error = [checked]
+            return ''
+        self._context = checked[-_ERROR_CONTEXT:]
+        return body
+
+    def errorMessage(self) -> str:
+        return ''.join(self.error)
+
+
 class Clashi:
-    def __init__(self, file : str, verbose : bool = False):
+    def __init__(self, file, verbose : bool = False):
         """
         Clashi instance
 
         Parameters
         ----------
-        file : str
-            File path
+        file : str or list[str]
+            File path (or list of file paths loaded together)
         verbose : bool
             Print debug information
         """
         self._verbose = verbose
+        self.files = [file] if isinstance(file, str) else list(file)
         try:
-            self._process = pexpect.spawn('clashi', encoding='utf-8')
-            self._process.expect(_PROMPT)
+            with profiling.timer('clashi.spawn'):
+                command = _clashiCommand()
+                self._process = pexpect.spawn(command[0], command[1:], encoding='utf-8')
+                self._process.expect(_PROMPT)
 
             #self._process = Popen(['clashi'], stdin=PIPE, stdout=PIPE, stderr=PIPE)
 
@@ -37,9 +417,52 @@ class Clashi:
         self._process.delayafterread = None
         self._process.delaybeforesend = None
 
-        load_file_command = f':l {file}'
+        load_file_command = f':l {" ".join(self.files)}'
+
+        with profiling.timer('clashi.load'):
+            self._runCommand(load_file_command)
+        self._mtimes = self._readMtimes()
+
+    def _readMtimes(self):
+        """
+        Return the modification time of each loaded file and of the local modules they import
+        """
+        # Imported here because the result cache depends on this module
+        from .cache import _sources
+        return {f : getmtime(f) for f in _sources([f for f in self.files if exists(f)])}
+
+    def isOutdated(self):
+        """
+        Check if one of the loaded files (or a local module they import) changed
+        since it was (re)loaded
+
+        Returns
+        -------
+        output : bool
+        """
+        # The imports are only searched again when one of the known sources changed
+        return any(not exists(f) or getmtime(f) != t for f, t in self._mtimes.items())
+
+    def reload(self):
+        """
+        Reload the modules (:r) so that the changes to the sources are taken into account
+        """
+        self._runCommand(':r')
+        self._mtimes = self._readMtimes()
+
+    def isAlive(self):
+        """
+        Check if the clashi process is still running
+        """
+        return hasattr(self, '_process') and self._process.isalive()
 
-        self._runCommand(load_file_command)        
+    def close(self):
+        """
+        Terminate the clashi process
+        """
+        if hasattr(self, '_process') and self._process.isalive():
+            self._process.kill(1)
+            self._process.terminate()
 
     def _runCommand(self, command, timeout = -1):
         """
@@ -55,35 +478,41 @@ class Clashi:
         stdout : bytes
         stderr : bytes
         """
-        # Everything is done at once because the communication method can only be called once
-        
-        self._print_verbose(f"[Clashi] Sending command '{command}'")
+        parts = []
+        self._runCommandStream(command, parts.append, timeout)
 
-        self._process.send(command + '\n')
-        self._process.expect(_PROMPT, timeout=timeout)
+        # Lines are joined back together, the last line break (before the prompt) is removed
+        output = ''.join(''.join(parts).splitlines()[:-1])
+        self._print_verbose(f"[Clashi] Output : {output}")
+
+        return output
+
+    def _processOutput(self, raw_output):
+        """
+        Check the raw output of a command for errors and remove the command echo and the escape codes
 
-        raw_output = self._process.before
+        Parameters
+        ----------
+        raw_output : str
 
+        Returns
+        -------
+        output : str
+        """
         self._print_verbose(f"[Clashi] Raw output : ")
         self._print_verbose(raw_output)
         self._print_verbose(f"[Clashi] (end of raw output) ")
 
-        if 'error:' in raw_output or 'Exception:' in raw_output:
-            raise RuntimeError(raw_output)
-
-        # Return the 
-        # Convert \x1b> to \n (because that's what clashi uses ??)
-        filtered_output = raw_output.replace('\x1b>', '\n')
-        # Remove all other ANSI escape codes
-        ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-        filtered_output = ansi_escape.sub('', filtered_output)
-        # Split lines
-        split_output = filtered_output.splitlines()
-        # Only keep the middle ones (remove the function call and the last line break)
-        output = ''.join(split_output[1:-1])
+        outputFilter = _OutputFilter()
+        # The prompt (removed by pexpect) marks the end of the output
+        body = outputFilter.feed(raw_output + _PROMPT)
+        if outputFilter.error is not None:
+            raise RuntimeError(outputFilter.errorMessage())
 
-        return output
+        # Only keep the middle lines (the function call and the last line break are removed)
+        return ''.join(body.splitlines()[:-1])
 
+    @profiling.timed('parse.sampleN')
     def _sampleNParser(self, data, singleValue):
         """
         Parse the data by level
@@ -109,45 +538,57 @@ class Clashi:
 
         Returns
         -------
-        values : str
+        values : list[list[str]]
         """
-
-        level = 0
-        values = [['']]
-        vcounter = 0
-        for d in data[1:-1]:
-            if d == '(':
-                level += 1
-                if level == 1:
-                    if not singleValue:
-                        continue
-            elif d == ')':
-                level -= 1
-                if level == 0:
-                    vcounter = 0
-                    if not singleValue:
-                        continue
-            elif d == ',' and level == 0:
-                for v in values:
-                    v.append('')
-                continue
-            
-            #print(f"{level} : {d}")
-            if d == ',' and level == 1 and not singleValue:
-                vcounter += 1
-                if len(values) < vcounter + 1:
-                    values.append([''])
-            else:
-                values[vcounter][-1] += d
+        tokenizer = _SampleNTokenizer(singleValue)
+        tokenizer.feed(data)
+        values = tokenizer.close()
 
         for i, s in enumerate(values):
-                print(f"  {i} : {s}")
+            self._print_verbose(f"  {i} : {s}")
 
         return values
 
+    def _runCommandStream(self, command, consumer, timeout = -1):
+        """
+        Run a clashi command and give its output to consumer() chunk by chunk, as it arrives
+        The echo of the command and the escape codes are removed, only the text
+        before the prompt is given to the consumer
+
+        Parameters
+        ----------
+        command : str
+        consumer : callable
+            Called with each chunk of output (str)
+        timeout : int or float
+            Maximum time without receiving anything from clashi (in seconds),
+            -1 (default) uses the pexpect default timeout
+        """
+        self._print_verbose(f"[Clashi] Sending command '{command}' (streamed output)")
 
+        self._process.send(command + '\n')
 
-    def sampleN(self, N, entity, inputs, singleOutput):
+        # Data received after the last prompt (if any)
+        pending = self._process.buffer
+        self._process.buffer = ''
+        outputFilter = _OutputFilter()
+
+        with profiling.timer('clashi.command'):
+            while not outputFilter.done:
+                if not pending:
+                    pending = self._process.read_nonblocking(_CHUNK_SIZE, timeout)
+                profiling.count('clashi.outputChars', len(pending))
+                with profiling.timer('clashi.filter'):
+                    body = outputFilter.feed(pending)
+                pending = ''
+                if body:
+                    consumer(body)
+        profiling.count('clashi.commands')
+
+        if outputFilter.error is not None:
+            raise RuntimeError(outputFilter.errorMessage())
+
+    def sampleN(self, N, entity, inputs, singleOutput, domain = DEFAULT_DOMAIN):
         """
         run SampleN on a specified module
 
@@ -161,17 +602,119 @@ class Clashi:
             input signals
         singleOutput : bool
             Tells the parser there's only one input, and treat any tuple at a single value
+        domain : str
+            Clock domain of the simulation
         """
         # Run the testbench command
-        command = f'sampleN @System {N} ({entity} {inputs})\n'
+        command = f'sampleN @{domain} {N} ({entity} {inputs})'
 
-        raw_output = self._runCommand((command))
+        # The output is parsed while it is received
+        tokenizer = _SampleNTokenizer(singleOutput)
+        self._runCommandStream(command, profiling.timed('parse.tokenize')(tokenizer.feed))
 
-        output = self._sampleNParser(raw_output, singleOutput)
-
-        # output is a list of tuples (with each value corresponding to an output)
-        return output
+        # output is a list of arrays (one for each output, with a value per sample)
+        return tokenizer.arrays()
     
+    def sampleNFromFiles(self, N, entity, files, singleOutput, domain = DEFAULT_DOMAIN):
+        """
+        run SampleN on a specified module, the input signals are read from files
+        (one value per line, parsed with read)
+        The size of the command doesn't depend on the number of samples
+
+        Parameters
+        ----------
+        N : int
+            Number of sample to simulate
+        entity : str
+            Name of the entity
+        files : list[str]
+            One file per input signal (the values must be readable with read)
+        singleOutput : bool
+            Tells the parser there's only one input, and treat any tuple at a single value
+        domain : str
+            Clock domain of the simulation
+        """
+        command = _readInputsCommand(f'sampleN @{domain} {N}', entity, files)
+
+        tokenizer = _SampleNTokenizer(singleOutput)
+        self._runCommandStream(command, profiling.timed('parse.tokenize')(tokenizer.feed))
+
+        return tokenizer.arrays()
+
+    def sampleNMany(self, jobs : "list[SampleNJob]") -> "list[list[np.ndarray]]":
+        """
+        Run several sampleN simulations (of any entities and clock domains) in a
+        single clashi command, instead of one round-trip per simulation
+
+        The lists are printed one after the other by a single IO action and
+        split while they are received. The entities must be in scope (defined
+        or imported by the loaded file)
+
+        Parameters
+        ----------
+        jobs : list[SampleNJob]
+
+        Returns
+        -------
+        outputs : list[list[np.ndarray]]
+            Output arrays of each job (as returned by sampleN), in the same order as the jobs
+        """
+        if len(jobs) == 0:
+            return []
+        command = 'do { ' + ' '.join(f'{job._command()};' for job in jobs) + ' }'
+
+        demux = _SampleNDemux([job.singleOutput for job in jobs])
+        self._runCommandStream(command, profiling.timed('parse.tokenize')(demux.feed))
+        profiling.count('clashi.batchedJobs', len(jobs))
+
+        return demux.arrays()
+
+    def startSimulation(self, entity, files, domain = DEFAULT_DOMAIN):
+        """
+        Start a simulation whose samples are then read window by window with sampleNext()
+
+        The (lazy) list of samples is stored in an IORef inside clashi, each window
+        continues where the previous one stopped (the circuit state is kept) and the
+        samples already read can be garbage collected. The inputs are read lazily
+        from the files, they must exist until the simulation is stopped
+
+        Parameters
+        ----------
+        entity : str
+            Name of the entity
+        files : list[str]
+            One file per input signal (the values must be readable with read)
+        domain : str
+            Clock domain of the simulation
+        """
+        command = f'{_SIMULATION} <- ' + _readInputsCommand(f'sample @{domain}', entity, files, 'Data.IORef.newIORef')
+        self._runCommand(command)
+
+    def sampleNext(self, N, singleOutput):
+        """
+        Read the next N samples of the simulation started with startSimulation()
+
+        Parameters
+        ----------
+        N : int
+            Number of samples
+        singleOutput : bool
+            Tells the parser there's only one input, and treat any tuple at a single value
+        """
+        # The IORef keeps the rest of the list, the window is printed
+        command = f'Data.IORef.atomicModifyIORef {_SIMULATION} (\\s -> let (w, r) = Prelude.splitAt {N} s in (r, w))'
+
+        tokenizer = _SampleNTokenizer(singleOutput)
+        self._runCommandStream(command, profiling.timed('parse.tokenize')(tokenizer.feed))
+
+        return tokenizer.arrays()
+
+    def stopSimulation(self):
+        """
+        Release the samples of the simulation started with startSimulation()
+        """
+        self._runCommand(f'Data.IORef.writeIORef {_SIMULATION} []')
+
     def testFunction(self, entity : str, inputs : list[str]):
         """
         Test a function with the given arguments
@@ -196,13 +739,255 @@ class Clashi:
 
         return output
 
+    def testFunctionMany(self, entity : str, inputs : "list[list[str]]") -> "list[str]":
+        """
+        Test a function with multiple sets of arguments in a single command
+
+        Parameters
+        ----------
+        entity : str
+            Name of the entity / function
+        inputs : list[list[str]]
+            Arguments of each call
+
+        Returns
+        -------
+        outputs : list[str]
+            Result of each call
+        """
+        if len(inputs) == 0:
+            return []
+        # Each argument is parenthesized so that negative numbers or constructors with fields are passed as a whole
+        calls = ','.join(f'{entity} {" ".join(f"({x})" for x in args)}' for args in inputs)
+        # One result per line (show never outputs a line break), so that results
+        # containing commas (lists, vectors, records, ...) are kept whole
+        command = f'Prelude.mapM_ Prelude.print [{calls}]'
+
+        chunks = []
+        self._runCommandStream(command, chunks.append)
+        outputs = [line.strip() for line in ''.join(chunks).splitlines()]
+        outputs = [line for line in outputs if line]
+        if len(outputs) != len(inputs):
+            raise RuntimeError(f"Expected {len(inputs)} results from {entity}, got {len(outputs)}")
+
+        return outputs
+
     def __del__(self):
-        self._process.kill(1)
-        self._process.terminate()
+        self.close()
 
     def _print_verbose(self, x):
         if self._verbose:
             print(x)
 
-        
 
+class AsyncClashi(Clashi):
+    """
+    Clashi instance whose commands can be awaited, so that multiple sessions can
+    be driven concurrently from an event loop (with asyncio.gather for example)
+
+    The instance must be created with
+        clashi = await AsyncClashi.create(file)
+    """
+    @classmethod
+    async def create(cls, file, verbose : bool = False) -> "AsyncClashi":
+        """
+        Spawn clashi and load the file(s) without blocking the event loop
+
+        Parameters
+        ----------
+        file : str or list[str]
+            File path (or list of file paths loaded together)
+        verbose : bool
+            Print debug information
+
+        Returns
+        -------
+        clashi : AsyncClashi
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, cls, file, verbose)
+
+    def _commandLock(self):
+        # Created on first use so that it is bound to the running loop
+        if not hasattr(self, '_lock'):
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _readAsync(self, deadline):
+        """
+        Read the next chunk of output without blocking the event loop
+
+        The pty is read (without waiting) when it has data, everything available
+        up to _CHUNK_SIZE characters is returned at once
+
+        Parameters
+        ----------
+        deadline : float
+            Event loop time after which pexpect.TIMEOUT is raised, None waits forever
+        """
+        loop = asyncio.get_running_loop()
+        fd = self._process.child_fd
+        while True:
+            try:
+                return self._process.read_nonblocking(_CHUNK_SIZE, 0)
+            except pexpect.TIMEOUT:
+                pass
+
+            readable = loop.create_future()
+            loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+            try:
+                remaining = None if deadline is None else max(0, deadline - loop.time())
+                await asyncio.wait_for(readable, remaining)
+            except asyncio.TimeoutError:
+                raise pexpect.TIMEOUT("Timeout exceeded while waiting for clashi") from None
+            finally:
+                loop.remove_reader(fd)
+
+    def _deadline(self, timeout):
+        """
+        Event loop time at which a command times out (-1 uses the pexpect default timeout, None waits forever)
+        """
+        if timeout == -1:
+            timeout = self._process.timeout
+        return None if timeout is None else asyncio.get_running_loop().time() + timeout
+
+    async def _resync(self, timeout):
+        """
+        Interrupt the running command and wait until clashi is back at the prompt
+
+        A marker expression is evaluated after the interrupt, waiting for its
+        result guarantees that any prompt printed by the interrupted command
+        has been consumed
+        """
+        marker = randrange(10**8, 10**9 - 1)
+        self._process.sendintr()
+        self._process.send(f'{marker} + 1\n')
+        deadline = self._deadline(timeout)
+        expected = str(marker + 1)
+        # Only the end of the output that may contain the start of the marker (or the prompt after it) is kept
+        text = self._process.buffer
+        self._process.buffer = ''
+        while True:
+            i = text.find(expected)
+            if i == -1:
+                text = text[-(len(expected) - 1):]
+            else:
+                j = text.find(_PROMPT, i + len(expected))
+                if j != -1:
+                    self._process.buffer = text[j + len(_PROMPT):]
+                    return
+                text = text[i:]
+            text += await self._readAsync(deadline)
+
+    async def _runCommandStreamAsync(self, command, consumer, timeout = -1):
+        """
+        Run a clashi command without blocking the event loop and give its output
+        to consumer() chunk by chunk, as it arrives (see Clashi._runCommandStream)
+
+        If the command times out or is cancelled, it is interrupted and the
+        session is brought back to the prompt so that it can still be used
+
+        Parameters
+        ----------
+        command : str
+        consumer : callable
+            Called with each chunk of output (str)
+        timeout : int or float
+            Timeout of the whole command in seconds, -1 (default) uses the
+            pexpect default timeout, None waits forever
+        """
+        async with self._commandLock():
+            self._print_verbose(f"[Clashi] Sending command '{command}' (streamed output)")
+            deadline = self._deadline(timeout)
+            self._process.send(command + '\n')
+
+            # Data received after the last prompt (if any)
+            pending = self._process.buffer
+            self._process.buffer = ''
+            outputFilter = _OutputFilter()
+            try:
+                with profiling.timer('clashi.command'):
+                    while not outputFilter.done:
+                        if not pending:
+                            pending = await self._readAsync(deadline)
+                        profiling.count('clashi.outputChars', len(pending))
+                        with profiling.timer('clashi.filter'):
+                            body = outputFilter.feed(pending)
+                        pending = ''
+                        if body:
+                            consumer(body)
+            except (asyncio.CancelledError, pexpect.TIMEOUT) as e:
+                try:
+                    await asyncio.shield(self._resync(_RESYNC_TIMEOUT))
+                except BaseException:
+                    # The session couldn't be recovered
+                    self.close()
+                    raise
+                if isinstance(e, pexpect.TIMEOUT):
+                    raise TimeoutError(f"Command '{command}' timed out") from None
+                raise
+            profiling.count('clashi.commands')
+
+            if outputFilter.error is not None:
+                raise RuntimeError(outputFilter.errorMessage())
+
+    async def _runCommandAsync(self, command, timeout = -1):
+        """
+        Run a clashi command without blocking the event loop (see _runCommandStreamAsync)
+
+        Returns
+        -------
+        output : str
+        """
+        chunks = []
+        await self._runCommandStreamAsync(command, chunks.append, timeout)
+        # Only keep the middle lines (the last line break is removed), like _processOutput
+        return ''.join(''.join(chunks).splitlines()[:-1])
+
+    async def sampleNAsync(self, N, entity, inputs, singleOutput, timeout = -1, domain = DEFAULT_DOMAIN):
+        """
+        Awaitable version of sampleN
+
+        Parameters
+        ----------
+        N : int
+            Number of sample to simulate
+        entity : str
+            Name of the entity
+        inputs : str
+            input signals
+        singleOutput : bool
+            Tells the parser there's only one input, and treat any tuple at a single value
+        timeout : int or float
+            Timeout in seconds
+        domain : str
+            Clock domain of the simulation
+        """
+        command = f'sampleN @{domain} {N} ({entity} {inputs})'
+
+        # The output is parsed while it is received
+        tokenizer = _SampleNTokenizer(singleOutput)
+        await self._runCommandStreamAsync(command, profiling.timed('parse.tokenize')(tokenizer.feed), timeout)
+
+        return tokenizer.arrays()
+
+    async def testFunctionAsync(self, entity : str, inputs : "list[str]", timeout = -1):
+        """
+        Awaitable version of testFunction
+
+        Parameters
+        ----------
+        entity : str
+            Name of the entity / function
+        inputs : list[str]
+            List of inputs (str)
+        timeout : int or float
+            Timeout in seconds
+
+        Returns
+        -------
+        output : str
+        """
+        command = f'{entity} {" ".join(inputs)}'
+
+        return await self._runCommandAsync(command, timeout)
@@ -0,0 +1,203 @@
+# Compiled simulation backend
+#
+# Generate a small Main module around the entity, compile it once with clash
+# (ghc -O2) and run the binary instead of interpreting the design in clashi.
+# Binaries are cached on disk, keyed by a hash of the sources
+
+from hashlib import sha256
+from os import environ, makedirs, replace
+from os.path import abspath, dirname, exists, expanduser, join
+from subprocess import DEVNULL, PIPE, STDOUT, Popen, run
+from tempfile import TemporaryDirectory, TemporaryFile
+import re
+
+from .clashi import _CHUNK_SIZE, _ERROR_CONTEXT, DEFAULT_DOMAIN, _SampleNTokenizer
+from . import profiling
+
+DEFAULT_COMPILER = 'clash'
+DEFAULT_FLAGS = ['-O2']
+
+_MODULE = re.compile(r'^module\s+([\w.]+)', re.MULTILINE)
+
+def _cacheDirectory() -> str:
+    """
+    Directory of the compiled binaries ($CLASH_TESTBENCH_CACHE or ~/.cache/clash_testbench)
+    """
+    return environ.get('CLASH_TESTBENCH_CACHE', join(expanduser('~'), '.cache', 'clash_testbench'))
+
+def _mainSource(modules : "list[str]", sampler : str, entity : str, nInputs : int) -> str:
+    """
+    Return the source of the Main module
+
+    The binary is called with the number of samples followed by one file per
+    input signal (one value per line, parsed with read). The sampled list is
+    printed like clashi does
+    """
+    imports = '\n'.join(f'import {m}' for m in modules)
+    binds = '\n'.join(f'  i{i} <- Prelude.readFile (files Prelude.!! {i})' for i in range(nInputs))
+    inputs = ' '.join(f'(fromList (Prelude.map Prelude.read (Prelude.lines i{i})))' for i in range(nInputs))
+    return f'''{{-# LANGUAGE NoImplicitPrelude, DataKinds, TypeApplications #-}}
+module Main (main) where
+
+import Clash.Prelude
+import qualified Prelude
+import System.Environment (getArgs)
+import System.IO (hSetBuffering, stdout, BufferMode (BlockBuffering))
+{imports}
+
+main :: Prelude.IO ()
+main = do
+  hSetBuffering stdout (BlockBuffering Prelude.Nothing)
+  n : files <- getArgs
+{binds}
+  Prelude.print ({sampler} (Prelude.read n :: Prelude.Int) ({entity} {inputs}))
+'''
+
+class CompiledClashi:
+    def __init__(self, file, verbose : bool = False, compiler : str = DEFAULT_COMPILER, flags : "list[str]" = None):
+        """
+        Compiled simulation backend, with the session interface of Clashi
+        (sampleNFromFiles, isOutdated, reload, close)
+
+        A binary is compiled for each entity (and number of inputs) the first time
+        it is sampled. The binaries are cached in $CLASH_TESTBENCH_CACHE
+        (~/.cache/clash_testbench by default) and are only rebuilt when the
+        source files or the local modules they import change
+
+        Only the file-based stimulus is supported (sampleNFromFiles), the
+        inputs of list literals and the functions are evaluated by clashi
+
+        Parameters
+        ----------
+        file : str or list[str]
+            File path (or list of file paths)
+        verbose : bool
+            Print debug information
+        compiler : str
+            Compiler executable (clash by default)
+        flags : list[str]
+            Compiler flags, ['-O2'] by default
+        """
+        self._verbose = verbose
+        self.files = [file] if isinstance(file, str) else list(file)
+        self.compiler = compiler
+        self.flags = list(DEFAULT_FLAGS if flags is None else flags)
+        self._modules = [self._moduleName(f) for f in self.files]
+        self._compilerVersion = None
+
+    @staticmethod
+    def _moduleName(file):
+        with open(file, encoding='utf-8') as f:
+            match = _MODULE.search(f.read())
+        if match is None or match.group(1) == 'Main':
+            raise ValueError(f"{file} must have a module header (other than Main) to be compiled")
+        return match.group(1)
+
+    def _version(self):
+        if self._compilerVersion is None:
+            try:
+                result = run([self.compiler, '--numeric-version'], stdin=DEVNULL, stdout=PIPE, stderr=STDOUT, encoding='utf-8')
+            except FileNotFoundError:
+                raise RuntimeError(f"Couldn't find {self.compiler} in the current environment")
+            self._compilerVersion = result.stdout.strip()
+        return self._compilerVersion
+
+    def _binary(self, sampler : str, entity : str, nInputs : int) -> str:
+        """
+        Return the path of the binary sampling the entity, compile it if it isn't in the cache
+        """
+        source = _mainSource(self._modules, sampler, entity, nInputs)
+        key = sha256()
+        for part in [self._version(), ' '.join(self.flags), source]:
+            key.update(part.encode('utf-8') + b'\0')
+        # Imported here because the result cache depends on this module
+        from .cache import _sources
+        # Same sources as the result cache (the files and their local imports)
+        for file in _sources(self.files):
+            with open(file, 'rb') as f:
+                key.update(f.read() + b'\0')
+        directory = join(_cacheDirectory(), key.hexdigest())
+        binary = join(directory, 'main')
+        if exists(binary):
+            self._print_verbose(f"[CompiledClashi] Using cached binary {binary}")
+            return binary
+
+        makedirs(_cacheDirectory(), exist_ok=True)
+        self._print_verbose(f"[CompiledClashi] Compiling {entity} into {binary}")
+        with TemporaryDirectory(prefix='build_', dir=_cacheDirectory()) as build:
+            main = join(build, 'Main.hs')
+            with open(main, 'w', encoding='utf-8') as f:
+                f.write(source)
+            includes = sorted({dirname(abspath(f)) for f in self.files})
+            command = [self.compiler, '--make', main, *self.flags, '-i' + ':'.join(includes),
+                '-outputdir', build, '-o', join(build, 'main')]
+            with profiling.timer('compiled.compile'):
+                result = run(command, stdin=DEVNULL, stdout=PIPE, stderr=STDOUT, encoding='utf-8')
+            if result.returncode != 0:
+                raise RuntimeError(result.stdout[-_ERROR_CONTEXT:])
+            # Other processes may be compiling the same binary, the last one to finish replaces it
+            makedirs(directory, exist_ok=True)
+            replace(join(build, 'main'), binary)
+        return binary
+
+    def _runStream(self, command, consumer):
+        """
+        Run the binary and give its output to consumer() chunk by chunk
+        """
+        self._print_verbose(f"[CompiledClashi] Running {' '.join(command)}")
+        with TemporaryFile() as errors:
+            with Popen(command, stdout=PIPE, stderr=errors, encoding='utf-8') as process:
+                with profiling.timer('compiled.run'):
+                    while True:
+                        chunk = process.stdout.read(_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        profiling.count('compiled.outputChars', len(chunk))
+                        consumer(chunk)
+            if process.returncode != 0:
+                errors.seek(0)
+                raise RuntimeError(errors.read().decode('utf-8', errors='replace')[-_ERROR_CONTEXT:])
+
+    def sampleNFromFiles(self, N, entity, files, singleOutput, domain = DEFAULT_DOMAIN):
+        """
+        run SampleN on a specified module, the input signals are read from files
+        (one value per line, parsed with read)
+
+        Parameters
+        ----------
+        N : int
+            Number of sample to simulate
+        entity : str
+            Name of the entity
+        files : list[str]
+            One file per input signal (the values must be readable with read)
+        singleOutput : bool
+            Tells the parser there's only one input, and treat any tuple at a single value
+        domain : str
+            Clock domain of the simulation (each domain has its own binary)
+        """
+        binary = self._binary(f'sampleN @{domain}', entity, len(files))
+
+        tokenizer = _SampleNTokenizer(singleOutput)
+        self._runStream([binary, str(N), *files], profiling.timed('parse.tokenize')(tokenizer.feed))
+
+        return tokenizer.arrays()
+
+    def isOutdated(self):
+        """
+        Always False, the binaries are keyed by the content of the files
+        """
+        return False
+
+    def reload(self):
+        pass
+
+    def isAlive(self):
+        return True
+
+    def close(self):
+        pass
+
+    def _print_verbose(self, x):
+        if self._verbose:
+            print(x)
@@ -0,0 +1,189 @@
+# Typed decoding of sampleN outputs
+#
+# Convert the columns of strings returned by the sampleN parser into typed
+# numpy arrays, with a single pass over each column
+
+from enum import Enum
+import re
+import warnings
+import numpy as np
+
+from .clashi import _SampleNTokenizer
+from . import profiling
+
+# Number of tokens joined at once when a tuple column is split
+_TUPLE_BATCH = 1 << 16
+
+# Patterns of a single token, used to guess the type of a column from its first value
+_INT = re.compile(r'-?\d+')
+_DOUBLE = re.compile(r'-?(?:\d+\.\d+(?:e-?\d+)?|Infinity|NaN)')
+_ENUM = re.compile(r"[A-Z][\w']*")
+# Characters that can't be part of an integer column (joined with '\n')
+_NOT_INT = re.compile(r'[^\d\n-]')
+_NOT_BINARY = re.compile(r'[^01\n]')
+
+class Kind(Enum):
+    BIT = 0
+    BOOL = 1
+    INT = 2
+    DOUBLE = 3
+    BITVECTOR = 4
+    ENUM = 5
+    TUPLE = 6
+    RAW = 7
+
+class Column:
+    def __init__(self, kind : Kind, values : np.ndarray, categories : np.ndarray = None, fields : "list[Column]" = None) -> None:
+        """
+        Decoded output column
+
+        Parameters
+        ----------
+        kind : Kind
+            Type of the values
+        values : np.ndarray
+            uint8 (BIT), bool (BOOL), int64 (INT, BITVECTOR), float64 (DOUBLE),
+            category codes (ENUM), structured array (TUPLE) or str (RAW).
+            INT and BITVECTOR values that don't fit in 64 bits are stored as Python ints (object)
+        categories : np.ndarray
+            Lookup table of the ENUM codes
+        fields : list[Column]
+            Columns of each TUPLE field
+        """
+        self.kind = kind
+        self.values = values
+        self.categories = categories
+        self.fields = fields
+
+    def __len__(self):
+        return len(self.values)
+
+    def array(self) -> np.ndarray:
+        """
+        Return the values with the enum codes replaced by their names
+        """
+        if self.kind == Kind.ENUM:
+            return self.categories[self.values]
+        return self.values
+
+    def __repr__(self) -> str:
+        return f"Column {self.kind.name} : {self.array()}"
+
+
+def _join(tokens):
+    return '\n'.join(tokens.tolist())
+
+def _fromString(tokens, joined, dtype):
+    """
+    Convert all the tokens (joined with '\n') at once, None is returned if one of them isn't valid
+    """
+    with warnings.catch_warnings():
+        # Invalid data is reported with a warning (and the conversion stops)
+        warnings.simplefilter('error')
+        try:
+            values = np.fromstring(joined, dtype=dtype, sep='\n')
+        except (ValueError, DeprecationWarning):
+            return None
+    return values if len(values) == len(tokens) else None
+
+def _decodeInt(tokens, joined):
+    if _NOT_INT.search(joined):
+        return None
+    values = _fromString(tokens, joined, np.int64)
+    if values is None or np.any(values == np.iinfo(np.int64).max) or np.any(values == np.iinfo(np.int64).min):
+        # Invalid or saturated (out of the int64 range)
+        try:
+            return np.array([int(t) for t in tokens.tolist()], dtype=object)
+        except ValueError:
+            return None
+    return values
+
+def _decodeBitVector(tokens):
+    if not np.all(np.char.startswith(tokens, '0b')):
+        return None
+    digits = np.char.replace(np.char.replace(tokens, '0b', ''), '_', '')
+    if _NOT_BINARY.search(_join(digits)):
+        return None
+    width = np.char.str_len(digits)
+    if np.all(width == width[0]) and 0 < width[0] < 64:
+        # Fixed width, convert all the digits at once
+        w = int(width[0])
+        bits = digits.astype(f'S{w}').view(np.uint8).reshape(-1, w) - ord('0')
+        return bits.astype(np.int64) @ (np.int64(1) << np.arange(w - 1, -1, -1, dtype=np.int64))
+    return np.array([int(t, 2) for t in digits.tolist()], dtype=object)
+
+def _decodeTuple(tokens):
+    tokenizer = _SampleNTokenizer(False)
+    tokenizer.feed('[')
+    for i in range(0, len(tokens), _TUPLE_BATCH):
+        separator = ',' if i > 0 else ''
+        tokenizer.feed(separator + ','.join(tokens[i:i+_TUPLE_BATCH].tolist()))
+    tokenizer.feed(']')
+    fields = [decodeColumn(c) for c in tokenizer.arrays()]
+    values = np.empty(len(tokens), dtype=[(f'f{i}', f.values.dtype) for i, f in enumerate(fields)])
+    for i, f in enumerate(fields):
+        values[f'f{i}'] = f.values
+    return values, fields
+
+@profiling.timed('parse.decode')
+def decodeColumn(tokens) -> Column:
+    """
+    Decode a column of values (as returned by the sampleN parser)
+
+    The type is guessed from the first value and checked on the whole column, recognized types are
+    Bit, Bool, Unsigned / Signed / Index / Int, Double, BitVector literals,
+    enum constructors and tuples of these. Anything else is kept as strings (RAW)
+
+    Parameters
+    ----------
+    tokens : np.ndarray or list[str]
+
+    Returns
+    -------
+    column : Column
+    """
+    tokens = np.asarray(tokens, dtype=str)
+    if len(tokens) == 0:
+        return Column(Kind.RAW, tokens)
+
+    first = str(tokens[0])
+
+    if first in ['0', '1'] and np.all((tokens == '0') | (tokens == '1')):
+        return Column(Kind.BIT, (tokens == '1').astype(np.uint8))
+    if first in ['True', 'False'] and np.all((tokens == 'True') | (tokens == 'False')):
+        return Column(Kind.BOOL, tokens == 'True')
+    if _INT.fullmatch(first):
+        values = _decodeInt(tokens, _join(tokens))
+        if values is not None:
+            return Column(Kind.INT, values)
+    if _DOUBLE.fullmatch(first):
+        values = _fromString(tokens, _join(tokens), np.float64)
+        if values is not None:
+            return Column(Kind.DOUBLE, values)
+    if first.startswith('0b'):
+        values = _decodeBitVector(tokens)
+        if values is not None:
+            return Column(Kind.BITVECTOR, values)
+    if _ENUM.fullmatch(first):
+        categories, codes = np.unique(tokens, return_inverse=True)
+        if all(_ENUM.fullmatch(c) for c in categories.tolist()):
+            return Column(Kind.ENUM, codes.astype(np.min_scalar_type(len(categories) - 1)), categories=categories)
+    if first.startswith('(') and np.all(np.char.startswith(tokens, '(') & np.char.endswith(tokens, ')')):
+        values, fields = _decodeTuple(tokens)
+        return Column(Kind.TUPLE, values, fields=fields)
+
+    return Column(Kind.RAW, tokens)
+
+def decode(columns : list) -> "list[Column]":
+    """
+    Decode all the columns returned by the sampleN parser
+
+    Parameters
+    ----------
+    columns : list[np.ndarray] or list[list[str]]
+
+    Returns
+    -------
+    columns : list[Column]
+    """
+    return [decodeColumn(c) for c in columns]
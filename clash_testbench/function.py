@@ -4,12 +4,132 @@
 #
 # Test a function
 
-from os.path import exists
+from collections import OrderedDict
+from os.path import exists, getmtime
+import numpy as np
+from rich.console import Console
+
+from .pool import ClashiPool, defaultPool
+from .decoder import decodeColumn, Kind
+from .cache import _sources
+
+# Number of results remembered by each function
+DEFAULT_MEMO_SIZE = 1 << 16
+# Number of calls sent to clashi in a single command by testMany()
+DEFAULT_BATCH_SIZE = 4096
+# Number of counterexamples kept by checkAgainst()
+DEFAULT_COUNTEREXAMPLES = 10
+# Above this number of combinations, sampled inputs are drawn independently (with replacement)
+_MAX_CHOICE = 1 << 62
+
+def _arguments(inputs) -> "tuple[str]":
+    """
+    Return the arguments of a call as a tuple of strings
+    """
+    if not isinstance(inputs, list):
+        # Make a list
+        inputs = [inputs]
+    # Convert to string if it wasn't the case yet
+    return tuple(x if isinstance(x, str) else str(x) for x in inputs)
+
+def bits(width : int, signed : bool = False) -> range:
+    """
+    Domain of all the values of a width-bit number (Unsigned / Signed / BitVector)
+
+    Parameters
+    ----------
+    width : int
+    signed : bool
+    """
+    if signed:
+        return range(-(1 << (width - 1)), 1 << (width - 1))
+    return range(1 << width)
+
+def _domainArrays(domain) -> "list[np.ndarray]":
+    """
+    Return the values of each argument of a domain
+    """
+    if isinstance(domain, (range, np.ndarray)):
+        domain = [domain]
+    arrays = []
+    for d in domain:
+        if isinstance(d, range):
+            arrays.append(np.arange(d.start, d.stop, d.step))
+        elif isinstance(d, (list, tuple, np.ndarray)):
+            arrays.append(np.asarray(d))
+        else:
+            raise TypeError(f"Invalid domain type : {type(d)}")
+        if len(arrays[-1]) == 0:
+            raise ValueError("Domains cannot be empty")
+    return arrays
+
+def _matches(tokens : np.ndarray, expected) -> np.ndarray:
+    """
+    Compare the outputs of clashi with the reference values (numerically if possible, as text otherwise)
+    """
+    expected = np.asarray(expected)
+    if expected.shape != (len(tokens),):
+        raise ValueError(f"The reference must return one value per input (expected shape {(len(tokens),)}, got {expected.shape})")
+    column = decodeColumn(tokens)
+    if column.kind in [Kind.BIT, Kind.BOOL, Kind.INT, Kind.BITVECTOR] and column.values.dtype != object and expected.dtype.kind in 'biu':
+        return column.values == expected
+    if column.kind == Kind.DOUBLE and expected.dtype.kind in 'fiu':
+        return np.isclose(column.values, expected, equal_nan=True)
+    return column.array().astype(str) == expected.astype(str)
+
+def _size(arguments : "tuple") -> tuple:
+    """
+    Sort key of a counterexample, smallest arguments first
+    """
+    return tuple(sorted((abs(x) if isinstance(x, (int, float)) else len(str(x))) for x in arguments)[::-1]) + tuple(map(str, arguments))
+
+class FunctionChecker:
+    def __init__(self, name : str, checked : int, failed : int, counterexamples : list):
+        """
+        Result of a comparison between a function and a reference (see Function.checkAgainst)
+
+        Parameters
+        ----------
+        name : str
+            Name of the function
+        checked : int
+            Number of inputs checked
+        failed : int
+            Number of inputs where the function doesn't match the reference
+        counterexamples : list[tuple]
+            (arguments, expected, actual) of the smallest failing inputs
+        """
+        self.name = name
+        self.checked = checked
+        self.failed = failed
+        self.counterexamples = counterexamples
+
+    def isValid(self):
+        return self.failed == 0
+
+    def message(self):
+        if self.isValid():
+            return f"Function '{self.name}' matches the reference ({self.checked} inputs)"
+        arguments, expected, actual = self.counterexamples[0]
+        return f"Function '{self.name}' doesn't match the reference for {self.failed} of {self.checked} inputs, smallest counterexample : {self.name} {' '.join(map(str, arguments))} = {actual} (expected {expected})"
+
+    def print(self):
+        """
+        Print the pass-fail report and the counterexamples
+        """
+        c = Console()
+        if self.isValid():
+            c.print(f"✅ {self.name} ({self.checked} inputs)", style='bold green')
+        else:
+            c.print(f"❌ {self.name} ({self.failed} / {self.checked} inputs fail)", style='bold red')
+            for arguments, expected, actual in self.counterexamples:
+                c.print(f"{self.name} {' '.join(map(str, arguments))}", highlight=False)
+                c.print(f"  {'expected':<8s} = {expected}", style='cyan', highlight=False)
+                c.print(f"  {'actual':<8s} = {actual}", style='dark_orange3', highlight=False)
 
-from .clashi import Clashi
 
 class Function:
-    def __init__(self, file, name) -> None:
+    def __init__(self, file, name, pool : ClashiPool = None, memoSize : int = DEFAULT_MEMO_SIZE) -> None:
         """
         Testbench generator
 
@@ -19,19 +139,58 @@ class Function:
             .hs file path
         name : str
             Name of the function
+        pool : ClashiPool
+            Pool providing the clashi sessions, the process-wide pool is used if None
+        memoSize : int
+            Number of results remembered (least recently used ones are forgotten first),
+            0 disables the memoization
         """
         # File
         if not exists(file):
             raise FileNotFoundError(f"File {file} doesn't exist")
 
-        self._clashi = Clashi(file)
+        self._pool = defaultPool() if pool is None else pool
         self._file = file
         self.name = name
+        self.memoSize = memoSize
+        # Results of the previous calls : {arguments : output}
+        self._memo = OrderedDict()
+        # Modification time of the sources (file and local imports) when the results were computed
+        self._sourceMtimes = self._readMtimes()
+        # Load the file now so that errors are reported when the function is created
+        with self._pool.session(self._file):
+            pass
+
+    def _readMtimes(self) -> dict:
+        return {f : getmtime(f) for f in _sources([self._file]) if exists(f)}
+
+    def _checkMemo(self):
+        """
+        Forget the results if a source changed since they were computed (the
+        sessions reload it)
+        """
+        # The sources are only searched again when one of the known ones changed
+        if any(not exists(f) or getmtime(f) != t for f, t in self._sourceMtimes.items()):
+            self._memo.clear()
+            self._sourceMtimes = self._readMtimes()
+
+    def _remember(self, arguments, output):
+        if self.memoSize > 0:
+            self._memo[arguments] = output
+            self._memo.move_to_end(arguments)
+            while len(self._memo) > self.memoSize:
+                self._memo.popitem(last=False)
+
+    def _recall(self, arguments):
+        output = self._memo.get(arguments)
+        if output is not None:
+            self._memo.move_to_end(arguments)
+        return output
 
     def test(self, inputs):
         """
         Test the function with the given inputs
-        
+
         Parameters
         ----------
         inputs : list or single value
@@ -40,20 +199,135 @@ class Function:
         -------
         output : str
         """
-        if not isinstance(inputs, list):
-            # Make a list
-            inputs = [inputs]
-        
-        # Convert to string if it wasn't the case yet
-        inputs = [x if isinstance(x, str) else str(x) for x in inputs]
+        arguments = _arguments(inputs)
 
+        self._checkMemo()
+        output = self._recall(arguments)
+        if output is None:
+            with self._pool.session(self._file) as clashi:
+                output = clashi.testFunction(self.name, list(arguments))
+            self._remember(arguments, output)
 
+        return output
 
-        output = self._clashi.testFunction(self.name, inputs)
+    def testMany(self, inputs : list, batchSize : int = DEFAULT_BATCH_SIZE) -> "list[str]":
+        """
+        Test the function with multiple inputs
 
-        return output
+        The calls are evaluated by batches (a list of calls per clashi command)
+        and the results already known are taken from the memo
+
+        Parameters
+        ----------
+        inputs : list
+            Inputs of each call (list of arguments or single value)
+        batchSize : int
+            Maximum number of calls per command
+
+        Returns
+        -------
+        outputs : list[str]
+            Output of each call
+        """
+        if batchSize < 1:
+            raise ValueError("batchSize must be at least 1")
+        calls = [_arguments(x) for x in inputs]
+
+        self._checkMemo()
+        outputs = {}
+        missing = []
+        for arguments in calls:
+            if arguments in outputs:
+                continue
+            output = self._recall(arguments)
+            if output is None:
+                missing.append(arguments)
+                # Placeholder so that duplicates are only evaluated once
+                outputs[arguments] = None
+            else:
+                outputs[arguments] = output
+
+        if missing:
+            with self._pool.session(self._file) as clashi:
+                for i in range(0, len(missing), batchSize):
+                    batch = missing[i:i+batchSize]
+                    for arguments, output in zip(batch, clashi.testFunctionMany(self.name, [list(a) for a in batch])):
+                        outputs[arguments] = output
+                        self._remember(arguments, output)
+
+        return [outputs[arguments] for arguments in calls]
+
+    def checkAgainst(self, reference, domain, samples : int = None, seed : int = None, vectorized : bool = True,
+            batchSize : int = DEFAULT_BATCH_SIZE, counterexamples : int = DEFAULT_COUNTEREXAMPLES) -> FunctionChecker:
+        """
+        Compare the function with a Python reference over a domain of inputs
+
+        The inputs are enumerated (or sampled) batch by batch, each batch is
+        evaluated with a single clashi command and the reference is called once
+        per batch with numpy arrays
+
+        Parameters
+        ----------
+        reference : callable
+            Reference model, called with one array per argument and returning an
+            array with one value per input (or called with scalars if vectorized is False)
+        domain : range, list, np.ndarray or list of them
+            Values of each argument (a single domain for a single argument function),
+            the cartesian product of the domains is checked. See bits() for the
+            values of a given width
+        samples : int
+            Number of inputs randomly drawn from the domain. If None (or if it is
+            bigger than the domain), every input is checked
+        seed : int
+            Seed of the random sampling
+        vectorized : bool
+            The reference accepts arrays (default)
+        batchSize : int
+            Number of calls per clashi command
+        counterexamples : int
+            Number of counterexamples kept (the smallest ones)
+
+        Returns
+        -------
+        checker : FunctionChecker
+        """
+        if batchSize < 1:
+            raise ValueError("batchSize must be at least 1")
+        arrays = _domainArrays(domain)
+        shape = tuple(len(a) for a in arrays)
+        total = int(np.prod(shape, dtype=object))
+        rng = np.random.default_rng(seed)
 
-        
+        if samples is None or samples >= total:
+            N = total
+            def indices(start, stop):
+                return np.unravel_index(np.arange(start, stop), shape)
+        elif total <= _MAX_CHOICE:
+            N = samples
+            chosen = np.sort(rng.choice(total, samples, replace=False))
+            def indices(start, stop):
+                return np.unravel_index(chosen[start:stop], shape)
+        else:
+            N = samples
+            def indices(start, stop):
+                return tuple(rng.integers(0, n, stop - start) for n in shape)
 
+        if not vectorized:
+            reference = np.vectorize(reference, otypes=[object])
 
+        failed = 0
+        found = []
+        with self._pool.session(self._file) as clashi:
+            for start in range(0, N, batchSize):
+                stop = min(start + batchSize, N)
+                arguments = [a[i] for a, i in zip(arrays, indices(start, stop))]
+                expected = np.asarray(reference(*arguments))
+                calls = np.stack([a.astype(str) for a in arguments], axis=1).tolist()
+                actual = np.asarray(clashi.testFunctionMany(self.name, calls), dtype=str)
+                mismatch = np.flatnonzero(~_matches(actual, expected))
+                failed += len(mismatch)
+                found += [(tuple(a[i].item() for a in arguments), expected[i].item() if isinstance(expected[i], np.generic) else expected[i], str(actual[i])) for i in mismatch]
+                # Only the smallest counterexamples are kept
+                found = sorted(found, key=lambda f: _size(f[0]))[:counterexamples]
 
+        return FunctionChecker(self.name, N, failed, found)
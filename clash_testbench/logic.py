@@ -2,11 +2,45 @@ from enum import Enum
 from random import randint
 import numpy as np
 
+from . import profiling
+
 class Level(Enum):
     LOW = 0
     HIGH = 1
     UNKNOWN = 2
 
+class Unknown(Enum):
+    """
+    Resolution of Level.UNKNOWN samples when they are given to clashi
+    """
+    ZERO = 0
+    ONE = 1
+    RANDOM = 2
+
+def _resolveUnknown(N : int, policy : Unknown, rng : np.random.Generator = None) -> np.ndarray:
+    """
+    Return N values (0 or 1) for unknown samples
+    """
+    if policy == Unknown.ZERO:
+        return np.zeros(N, dtype=np.int64)
+    elif policy == Unknown.ONE:
+        return np.ones(N, dtype=np.int64)
+    elif policy == Unknown.RANDOM:
+        if rng is None:
+            rng = np.random.default_rng()
+        return rng.integers(0, 2, N)
+    else:
+        raise ValueError(f"Invalid unknown policy : {policy}")
+
+# Level code of the samples whose value is stored in the data array (array representation)
+DATA = 3
+
+_LEVELS = [Level.LOW, Level.HIGH, Level.UNKNOWN]
+
+def _checkType(value):
+    if not (np.issubdtype(type(value), np.integer) or isinstance(value, str) or isinstance(value, Level)):
+        raise TypeError(f"Cannot set a sample with value type : {type(value)}")
+
 class Sample:
     def __init__(self, value, colorIndex : int = 0) -> None:
         """
@@ -18,16 +52,15 @@ class Sample:
         colorIndex : int
             Index of the signal color
         """
-        if not (np.issubdtype(type(value), np.integer) or isinstance(value, str) or isinstance(value, Level)):
-            raise TypeError(f"Cannot set a sample with value type : {type(value)}")
-        
+        _checkType(value)
+
         self._value = value
 
         self.colorIndex = colorIndex
 
     def __str__(self) -> str:
         return self._value.__str__()
-    
+
     def value(self):
         if self._value == Level.LOW:
             return 0
@@ -37,92 +70,296 @@ class Sample:
             return randint(0,1)
         else:
             return self._value
-    
+
     def __repr__(self) -> str:
         return self._value.__repr__()
 
+
+def _dataArray(values : list) -> np.ndarray:
+    """
+    Create the data array of a list of values (without levels)
+    ints are stored as int64, strings as str and anything else (mixed types, big ints) as object
+    """
+    types = set(map(type, values))
+    if all(issubclass(t, (int, np.integer)) and not issubclass(t, (bool, np.bool_)) for t in types):
+        try:
+            return np.array(values, dtype=np.int64)
+        except OverflowError:
+            pass
+    elif all(issubclass(t, str) for t in types):
+        return np.array(values, dtype=str)
+    return np.array(values, dtype=object)
+
+def _concatenate(a : np.ndarray, b : np.ndarray) -> np.ndarray:
+    """
+    Concatenate two data arrays, using an object array if their types aren't compatible
+    """
+    if a.dtype == b.dtype or (a.dtype.kind == b.dtype.kind and a.dtype.kind in 'iuU'):
+        return np.concatenate([a, b])
+    return np.concatenate([a.astype(object), b.astype(object)])
+
+def _toPython(x):
+    return x.item() if isinstance(x, np.generic) else x
+
 class Signal:
     def __init__(self, name : str, values : list = None) -> None:
-        self.name = name
+        """
+        Signal (list of samples)
 
-        self.samples : "list[Sample]" = []
+        The samples are stored as arrays :
+        - a level for each sample (Level value, or DATA if the sample has a value)
+        - the data of each sample (only meaningful for DATA samples). If categories
+          isn't None, the data are indices into it
+        - the color index of each sample
 
+        Parameters
+        ----------
+        name : str
+            Name of the signal
+        values : list, np.ndarray or int
+            Values of the signal
+        """
+        self.name = name
+        # Incremented whenever the samples change
+        self._version = 0
+
+        self._setArrays(np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8))
 
         if values is not None:
-            if isinstance(values, np.ndarray):
-                self.fromList(values.tolist())
-            elif isinstance(values, int):
+            if isinstance(values, int):
                 self.fromList([values])
             else:
                 self.fromList(values)
 
+    def _setArrays(self, levels : np.ndarray, data : np.ndarray, colors : np.ndarray, categories : np.ndarray = None, shared : bool = False):
+        self._levels = levels
+        self._data = data
+        self._colors = colors
+        self._categories = categories
+        # The arrays are shared with another signal (or read-only), they are copied before being modified
+        self._shared = shared
+        self._version += 1
+
+    def _makeWritable(self):
+        if self._shared:
+            self._levels = np.array(self._levels)
+            self._data = np.array(self._data)
+            self._colors = np.array(self._colors)
+            self._shared = False
+
+    def _decategorize(self):
+        """
+        Replace the category indices by the values
+        """
+        if self._categories is not None:
+            self._data = self._categories[self._data]
+            self._categories = None
+
+    def _valueAt(self, i : int):
+        level = self._levels[i]
+        if level == DATA:
+            d = self._data[i]
+            return _toPython(d if self._categories is None else self._categories[d])
+        return _LEVELS[level]
+
     def __iadd__(self, x):
         if isinstance(x, Sample):
-            self.samples.append(x)
+            other = Signal(self.name)
+            other.fromSamples([x])
         elif isinstance(x, list) or isinstance(x, np.ndarray):
-            for xi in x:
-                self.samples.append(Sample(xi))
+            other = Signal(self.name, x)
         else:
             raise TypeError(f"Cannot add type {type(x)} to Signal")
+        if len(other) > 0:
+            if len(self) == 0:
+                self._setArrays(other._levels, other._data, other._colors, other._categories)
+            else:
+                self._decategorize()
+                other._decategorize()
+                self._setArrays(
+                    np.concatenate([self._levels, other._levels]),
+                    _concatenate(self._data, other._data),
+                    np.concatenate([self._colors, other._colors]))
         return self
 
     def __iter__(self):
-        self._samples_iter = iter(self.samples)
+        self._samples_iter = (self[i] for i in range(len(self)))
         return self
 
     def __next__(self):
         return next(self._samples_iter)
 
     def __getitem__(self, key):
-        return self.samples[key]
-    
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        return Sample(self._valueAt(key), int(self._colors[key]))
+
+    def _setValues(self, key, values : list):
+        other = Signal(self.name, values)
+        other._decategorize()
+        self._decategorize()
+        self._makeWritable()
+        if other._data.dtype != self._data.dtype:
+            # Use a type that can hold both the current and the new values
+            self._data = _concatenate(self._data, other._data[:0])
+        # A single value is set over the whole key
+        single = len(other) == 1
+        self._levels[key] = other._levels[0] if single else other._levels
+        self._data[key] = other._data[0] if single else other._data
+        self._colors[key] = 0
+        self._version += 1
+
     def __setitem__(self, key, value):
-        if isinstance(key, int):
-            self.samples[key] = Sample(value)
+        if isinstance(key, (int, np.integer)):
+            self._setValues(key, [value])
         elif isinstance(key, slice):
             if isinstance(value, list):
-                self.samples[key] = [Sample(value) for value in value]
+                self._setValues(key, value)
             else:
-                # dirty hack, create a constant list of the same size and slice it the same way
-                self.samples[key] = ([Sample(value)] * len(self.samples))[key]
-
+                # Constant value over the whole slice
+                self._setValues(key, [value])
 
+    def __len__(self):
+        return len(self._levels)
 
-            pass
+    @property
+    def samples(self) -> "list[Sample]":
+        """
+        List of samples (created from the arrays)
+        """
+        return self[:]
 
-    def __len__(self):
-        return len(self.samples)
+    @samples.setter
+    def samples(self, samples : "list[Sample]"):
+        self.fromSamples(samples)
 
     def copy(self):
         newSignal = Signal(self.name)
-        newSignal.samples = self.samples.copy()
+        # Both signals share the arrays until one of them is modified
+        self._shared = True
+        newSignal._setArrays(self._levels, self._data, self._colors, self._categories, shared=True)
+        return newSignal
+
+    def window(self, start : int, stop : int) -> "Signal":
+        """
+        Return the samples [start, stop) as a new signal, the arrays are shared (no copy)
+        """
+        newSignal = Signal(self.name)
+        self._shared = True
+        newSignal._setArrays(self._levels[start:stop], self._data[start:stop], self._colors[start:stop], self._categories, shared=True)
         return newSignal
 
+    @profiling.timed('signal.fromList')
     def fromList(self, lst : list):
         """
         Create a signal from a list of values
         """
-        self.samples = []
-        for l in lst:
-            self.samples.append(Sample(l))
-    
+        if not isinstance(lst, (list, np.ndarray)):
+            lst = list(lst)
+        if isinstance(lst, np.ndarray) and lst.dtype.kind in 'iuU':
+            levels = np.full(len(lst), DATA, dtype=np.uint8)
+            data = lst.astype(np.int64) if lst.dtype.kind in 'iu' else lst
+        else:
+            if isinstance(lst, np.ndarray):
+                lst = lst.tolist()
+            types = set(map(type, lst))
+            for t in types:
+                if not (issubclass(t, (str, Level)) or np.issubdtype(t, np.integer)):
+                    raise TypeError(f"Cannot set a sample with value type : {t}")
+            if Level in types:
+                levels = np.array([l.value if isinstance(l, Level) else DATA for l in lst], dtype=np.uint8)
+                # Placeholder data of the logic levels, of the same type as the other values
+                placeholder = '' if types <= {Level, str} and len(types) > 1 else 0
+                data = _dataArray([placeholder if isinstance(l, Level) else l for l in lst])
+            else:
+                levels = np.full(len(lst), DATA, dtype=np.uint8)
+                data = _dataArray(lst)
+        self._setArrays(levels, data, np.zeros(len(lst), dtype=np.uint8))
+
+    def fromSamples(self, samples : "list[Sample]"):
+        """
+        Create a signal from a list of samples
+        """
+        self.fromList([s._value for s in samples])
+        self._colors = np.array([s.colorIndex for s in samples], dtype=np.uint8)
+        self._version += 1
+
+    @profiling.timed('signal.fromColumn')
+    def fromColumn(self, column, tokens : np.ndarray):
+        """
+        Create a signal from a decoded sampleN output column
+
+        Bits (and the 0 / 1 values of integer columns) become logic levels, like
+        the '0' / '1' strings. Types whose values cannot be written back exactly
+        (doubles, bit vectors, tuples, ...) keep the original strings
+
+        Parameters
+        ----------
+        column : decoder.Column
+        tokens : np.ndarray
+            Strings the column was decoded from
+        """
+        # Imported here because the decoder depends on clashi
+        from .decoder import Kind
+
+        N = len(column)
+        colors = np.zeros(N, dtype=np.uint8)
+        if column.kind == Kind.BIT:
+            self._setArrays(column.values.astype(np.uint8), np.zeros(N, dtype=np.int64), colors)
+        elif column.kind == Kind.INT and column.values.dtype == np.int64:
+            v = column.values
+            levels = np.where(v == 0, Level.LOW.value, np.where(v == 1, Level.HIGH.value, DATA)).astype(np.uint8)
+            self._setArrays(levels, v, colors)
+        elif column.kind == Kind.ENUM:
+            self._setArrays(np.full(N, DATA, dtype=np.uint8), column.values, colors, column.categories)
+        elif column.kind == Kind.BOOL:
+            self._setArrays(np.full(N, DATA, dtype=np.uint8), column.values.astype(np.uint8), colors, np.array(['False', 'True']))
+        else:
+            self.fromList(np.asarray(tokens, dtype=str))
+
     def fit(self, N : int):
         """
         Fit the signal to an integer
         """
-        self.samples = N * [self.samples[0]]
+        # Read-only views of the first sample
+        self._setArrays(
+            np.broadcast_to(self._levels[:1], (N,)),
+            np.broadcast_to(self._data[:1], (N,)),
+            np.broadcast_to(self._colors[:1], (N,)),
+            self._categories,
+            shared=True)
 
-    def values(self):
+    def values(self, unknown : "Unknown" = None, rng : np.random.Generator = None):
         """
         Return a list of all samples
+
+        Parameters
+        ----------
+        unknown : Unknown
+            How Level.UNKNOWN samples are resolved, Unknown.RANDOM by default
+        rng : np.random.Generator
+            Generator used by Unknown.RANDOM (seed it to get reproducible values).
+            If None, an unseeded generator is used
         """
-        return [s.value() for s in self.samples]
+        unknown_policy = Unknown.RANDOM if unknown is None else unknown
+        N = len(self)
+        isData = self._levels == DATA
+        if self._categories is None and np.all(isData):
+            return self._data.tolist()
+
+        output = np.empty(N, dtype=object)
+        output[self._levels == Level.LOW.value] = 0
+        output[self._levels == Level.HIGH.value] = 1
+        unknown = self._levels == Level.UNKNOWN.value
+        output[unknown] = _resolveUnknown(np.count_nonzero(unknown), unknown_policy, rng).tolist()
+        data = self._data[isData]
+        if self._categories is not None:
+            data = self._categories[data]
+        output[isData] = data.tolist()
+        return output.tolist()
 
     def __str__(self) -> str:
         return f"Signal {self.name} : {self.samples}"
-    
+
     def __repr__(self) -> str:
         return self.__str__()
-
-
-    
\ No newline at end of file
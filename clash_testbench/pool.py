@@ -0,0 +1,224 @@
+# Clashi process pool
+#
+# Keep warm clashi sessions around so that testbenches and functions using the
+# same files don't have to spawn a new interpreter (and reload the modules)
+# every time
+
+from contextlib import contextmanager
+from os.path import abspath
+from threading import Condition, Lock
+from time import monotonic
+import atexit
+
+from .clashi import Clashi
+from . import profiling
+
+DEFAULT_MAX_SESSIONS = 4
+
+class ClashiPool:
+    def __init__(self, maxSessions : int = DEFAULT_MAX_SESSIONS, maxIdleTime : float = None) -> None:
+        """
+        Pool of clashi sessions, keyed by the set of loaded files
+
+        Parameters
+        ----------
+        maxSessions : int
+            Maximum number of clashi processes alive at the same time. When the
+            limit is reached, the least recently used idle session is evicted
+        maxIdleTime : float
+            Idle sessions older than this (in seconds) are closed. None (default)
+            means idle sessions are kept until they are evicted
+        """
+        if maxSessions < 1:
+            raise ValueError("maxSessions must be at least 1")
+        self.maxSessions = maxSessions
+        self.maxIdleTime = maxIdleTime
+        # Idle sessions, least recently used first : [(key, clashi, release time), ...]
+        self._idle = []
+        # Number of sessions currently in use (or being spawned)
+        self._busy = 0
+        self._condition = Condition()
+
+    @staticmethod
+    def _key(files):
+        if isinstance(files, str):
+            files = [files]
+        return tuple(sorted(abspath(f) for f in files))
+
+    def _popIdle(self, key):
+        """
+        Remove and return the most recently used idle session for this key (or None)
+        """
+        for i in reversed(range(len(self._idle))):
+            if self._idle[i][0] == key:
+                return self._idle.pop(i)[1]
+        return None
+
+    def _expire(self):
+        """
+        Close idle sessions that have been unused for longer than maxIdleTime
+        """
+        if self.maxIdleTime is not None:
+            now = monotonic()
+            expired = [s for s in self._idle if now - s[2] > self.maxIdleTime]
+            self._idle = [s for s in self._idle if now - s[2] <= self.maxIdleTime]
+            for _, clashi, _ in expired:
+                clashi.close()
+
+    def _trim(self):
+        """
+        Close the least recently used idle sessions above maxSessions
+        """
+        while self._idle and len(self._idle) + self._busy > self.maxSessions:
+            _, evicted, _ = self._idle.pop(0)
+            evicted.close()
+
+    def _resize(self, maxSessions : int):
+        """
+        Change maxSessions, the idle sessions above the new limit are closed
+        (and the busy ones when they are released)
+        """
+        with self._condition:
+            self.maxSessions = maxSessions
+            self._trim()
+            self._condition.notify_all()
+
+    @profiling.timed('pool.acquire')
+    def acquire(self, files, verbose : bool = False) -> Clashi:
+        """
+        Get a clashi session with the given files loaded. The session must be
+        given back with release() (or use session() instead)
+
+        Parameters
+        ----------
+        files : str or list[str]
+            File(s) loaded in the session
+        verbose : bool
+            Print debug information
+
+        Returns
+        -------
+        clashi : Clashi
+        """
+        key = self._key(files)
+        while True:
+            with self._condition:
+                self._expire()
+                while True:
+                    clashi = self._popIdle(key)
+                    if clashi is not None:
+                        break
+                    if len(self._idle) + self._busy < self.maxSessions:
+                        break
+                    if self._idle:
+                        # Make room by evicting the least recently used session
+                        _, evicted, _ = self._idle.pop(0)
+                        evicted.close()
+                        break
+                    # Every session is in use, wait for one to be released
+                    self._condition.wait()
+                self._busy += 1
+
+            try:
+                if clashi is None:
+                    clashi = Clashi(list(files) if not isinstance(files, str) else files, verbose)
+                elif not clashi.isAlive():
+                    clashi = None
+                else:
+                    clashi._verbose = verbose
+                    if clashi.isOutdated():
+                        clashi.reload()
+            except BaseException:
+                if clashi is not None:
+                    clashi.close()
+                with self._condition:
+                    self._busy -= 1
+                    self._condition.notify()
+                raise
+
+            if clashi is not None:
+                return clashi
+
+            # The session died while idle, try again
+            with self._condition:
+                self._busy -= 1
+
+    def release(self, clashi : Clashi):
+        """
+        Give a session back to the pool
+
+        Parameters
+        ----------
+        clashi : Clashi
+        """
+        with self._condition:
+            self._busy -= 1
+            if clashi.isAlive():
+                self._idle.append((self._key(clashi.files), clashi, monotonic()))
+            self._expire()
+            self._trim()
+            self._condition.notify()
+
+    def discard(self, clashi : Clashi):
+        """
+        Close a session instead of giving it back to the pool (if it is in an unknown state)
+
+        Parameters
+        ----------
+        clashi : Clashi
+        """
+        clashi.close()
+        self.release(clashi)
+
+    @contextmanager
+    def session(self, files, verbose : bool = False):
+        """
+        Context manager around acquire() / release()
+        If an exception other than a clashi error (RuntimeError) is raised, the
+        session is closed instead of being reused
+
+        Parameters
+        ----------
+        files : str or list[str]
+        verbose : bool
+        """
+        clashi = self.acquire(files, verbose)
+        try:
+            yield clashi
+        except RuntimeError:
+            # Clashi reported an error, the session is still at the prompt
+            self.release(clashi)
+            raise
+        except BaseException:
+            self.discard(clashi)
+            raise
+        else:
+            self.release(clashi)
+
+    def close(self):
+        """
+        Close all idle sessions
+        """
+        with self._condition:
+            for _, clashi, _ in self._idle:
+                clashi.close()
+            self._idle = []
+
+    def __len__(self):
+        with self._condition:
+            return len(self._idle) + self._busy
+
+
+_defaultPool = None
+_defaultPoolLock = Lock()
+
+def defaultPool() -> ClashiPool:
+    """
+    Return the process-wide clashi pool (created on first use)
+    """
+    global _defaultPool
+    with _defaultPoolLock:
+        if _defaultPool is None:
+            _defaultPool = ClashiPool()
+            atexit.register(_defaultPool.close)
+    return _defaultPool
@@ -0,0 +1,195 @@
+# Profiling
+#
+# Opt-in timers and counters around the hot paths (clashi spawn / load /
+# commands, output parsing, signal conversion, checking and rendering).
+# Disabled by default, enable() or CLASH_TESTBENCH_PROFILE=1 turns them on
+
+from functools import wraps
+from os import environ
+from threading import Lock, local
+from time import perf_counter
+
+from rich.console import Console
+from rich.table import Table
+
+_enabled = environ.get('CLASH_TESTBENCH_PROFILE', '') not in ['', '0']
+# Profiles collecting the measurements of the current thread (see collect())
+_local = local()
+
+def enable():
+    """
+    Turn the timers and counters on
+    """
+    global _enabled
+    _enabled = True
+
+def disable():
+    """
+    Turn the timers and counters off
+    """
+    global _enabled
+    _enabled = False
+
+def isEnabled() -> bool:
+    return _enabled
+
+class Profile:
+    def __init__(self) -> None:
+        """
+        Measurements of the timers ({name : [count, seconds]}) and counters ({name : value})
+        """
+        self._timers = {}
+        self._counters = {}
+        self._lock = Lock()
+
+    def addTime(self, name : str, seconds : float):
+        with self._lock:
+            timer = self._timers.setdefault(name, [0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+
+    def addCount(self, name : str, n : int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def merge(self, other : "Profile"):
+        """
+        Add the measurements of another profile to this one
+        """
+        report = other.report()
+        with self._lock:
+            for name, t in report['timers'].items():
+                timer = self._timers.setdefault(name, [0, 0.0])
+                timer[0] += t['count']
+                timer[1] += t['time']
+            for name, n in report['counters'].items():
+                self._counters[name] = self._counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._timers = {}
+            self._counters = {}
+
+    def report(self) -> dict:
+        """
+        Return the measurements
+
+        Returns
+        -------
+        report : dict
+            {'timers' : {name : {'count' : int, 'time' : float (seconds)}}, 'counters' : {name : int}}
+            Timers are inclusive (a timer includes the timers called inside it)
+        """
+        with self._lock:
+            return {
+                'timers' : {name : {'count' : c, 'time' : t} for name, (c, t) in self._timers.items()},
+                'counters' : dict(self._counters)
+            }
+
+    def table(self, title : str = None) -> Table:
+        """
+        Return the measurements as a rich table, slowest timers first
+        """
+        report = self.report()
+        table = Table(title=title)
+        table.add_column('Timer / counter')
+        table.add_column('Count', justify='right')
+        table.add_column('Total', justify='right')
+        table.add_column('Mean', justify='right')
+        for name, t in sorted(report['timers'].items(), key=lambda x: -x[1]['time']):
+            table.add_row(name, str(t['count']), f"{t['time']*1e3:.2f} ms", f"{t['time']/t['count']*1e3:.3f} ms")
+        for name, n in sorted(report['counters'].items()):
+            table.add_row(name, str(n), '', '')
+        return table
+
+    def print(self, title : str = None):
+        Console().print(self.table(title))
+
+    def __repr__(self) -> str:
+        return f"Profile {self.report()}"
+
+
+# Measurements of the whole process
+globalProfile = Profile()
+
+def _active() -> "list[Profile]":
+    return getattr(_local, 'profiles', []) + [globalProfile]
+
+class timer:
+    __slots__ = ['name', '_start']
+
+    def __init__(self, name : str) -> None:
+        """
+        Context manager measuring the time spent in a block (nothing is done if profiling is disabled)
+
+        Parameters
+        ----------
+        name : str
+            Name of the timer
+        """
+        self.name = name
+        self._start = None
+
+    def __enter__(self):
+        if _enabled:
+            self._start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        if self._start is not None:
+            elapsed = perf_counter() - self._start
+            self._start = None
+            for profile in _active():
+                profile.addTime(self.name, elapsed)
+
+def timed(name : str):
+    """
+    Decorator measuring the time spent in a function
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name : str, n : int = 1):
+    """
+    Increment a counter (nothing is done if profiling is disabled)
+    """
+    if _enabled:
+        for profile in _active():
+            profile.addCount(name, n)
+
+class collect:
+    def __init__(self) -> None:
+        """
+        Context manager collecting the measurements done by the current thread inside the block
+
+        with collect() as profile:
+            ...
+        """
+        self.profile = Profile()
+
+    def __enter__(self) -> Profile:
+        if not hasattr(_local, 'profiles'):
+            _local.profiles = []
+        _local.profiles.append(self.profile)
+        return self.profile
+
+    def __exit__(self, *args):
+        _local.profiles.remove(self.profile)
+
+def profiled(method):
+    """
+    Decorator of methods, the measurements done during the call are stored in self.profile
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with collect() as profile:
+            self.profile = profile
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,52 @@
+# Pytest plugin
+#
+# With --clash-profile, the clash_testbench timers are enabled and a summary
+# table (whole session and slowest tests) is printed at the end of the session
+
+from time import perf_counter
+
+import pytest
+from rich.console import Console
+
+from . import profiling
+
+# Number of tests detailed in the summary
+_SLOWEST = 5
+
+def pytest_addoption(parser):
+    group = parser.getgroup('clash_testbench')
+    group.addoption('--clash-profile', action='store_true', default=False,
+        help="Time the clash_testbench hot paths (clashi, parsing, checking, rendering) and print a summary")
+
+def pytest_configure(config):
+    if config.getoption('clash_profile'):
+        profiling.enable()
+        # {test id : (duration, profile)}
+        config._clashProfiles = {}
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    profiles = getattr(item.config, '_clashProfiles', None)
+    if profiles is None:
+        yield
+        return
+    start = perf_counter()
+    with profiling.collect() as profile:
+        yield
+    profiles[item.nodeid] = (perf_counter() - start, profile)
+
+def pytest_terminal_summary(terminalreporter, config):
+    profiles = getattr(config, '_clashProfiles', None)
+    if not profiles:
+        return
+    session = profiling.Profile()
+    for _, profile in profiles.values():
+        session.merge(profile)
+
+    terminalreporter.write_sep('=', 'clash_testbench profile')
+    console = Console()
+    console.print(session.table('Whole session'))
+    slowest = sorted(profiles.items(), key=lambda x: -x[1][0])[:_SLOWEST]
+    for nodeid, (duration, profile) in slowest:
+        if profile.report()['timers']:
+            console.print(profile.table(f"{nodeid} ({duration*1e3:.1f} ms)"))
@@ -8,12 +8,119 @@ from rich.text import Text
 from typing import Iterator
 
 #from .signals import Signal, LogicLevel
-from .logic import Signal, Level
-from .clashi import Clashi
+from .logic import Signal, Level, Unknown, DATA
+from .decoder import decodeColumn
+from .pool import ClashiPool, defaultPool
+from .clashi import DEFAULT_DOMAIN, SampleNJob
+from .compiled import CompiledClashi
+from .cache import ResultCache, _readChunks
+from .trace import TraceWriter, TRACE_EXTENSION, loadTrace, saveTrace, writeVCD
+from . import profiling
 
 from itertools import groupby
-
-from os.path import exists
+from contextlib import ExitStack, contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+from os import cpu_count, environ
+from os.path import abspath, exists, join
+from tempfile import TemporaryDirectory
+from enum import Enum
+
+# Number of input samples converted to text at once when the inputs are written to files
+_WRITE_CHUNK = 1 << 16
+# Number of samples compared at once by SignalChecker
+_CHECK_CHUNK = 1 << 20
+
+class Stimulus(Enum):
+    """
+    How the input signals are given to clashi
+    - LIST : as list literals inside the command (fromList [...]), works with any type
+    - FILE : written to temporary files (one value per line) that clashi reads,
+      the command size doesn't depend on the number of cycles. The input types
+      must have a Read instance
+    """
+    LIST = 0
+    FILE = 1
+
+class Engine(Enum):
+    """
+    How the testbench is simulated
+    - CLASHI : interpreted by clashi (sessions from a ClashiPool)
+    - COMPILED : compiled into a binary (see CompiledClashi), only with Stimulus.FILE
+    """
+    CLASHI = 0
+    COMPILED = 1
+
+def _logic(signal : Signal) -> np.ndarray:
+    """
+    Return the logic level of each sample : 0 for Level.LOW, '0' and 0, 1 for
+    Level.HIGH, '1' and 1, -1 otherwise
+    """
+    levels = signal._levels
+    logic = np.where(levels == DATA, -1, levels).astype(np.int8)
+    logic[levels == Level.UNKNOWN.value] = -1
+    data = signal._data
+    if signal._categories is not None:
+        values = signal._categories[data]
+    else:
+        values = data
+    isData = levels == DATA
+    if values.dtype.kind in 'iu':
+        logic[isData & (values == 0)] = 0
+        logic[isData & (values == 1)] = 1
+    elif values.dtype.kind in 'UO':
+        for value, level in [('0', 0), ('1', 1)] + ([(0, 0), (1, 1)] if values.dtype.kind == 'O' else []):
+            logic[isData & (values == value)] = level
+    return logic
+
+def _keys(signal : Signal) -> np.ndarray:
+    """
+    Return the values of the signal as comparable keys (ints or strings)
+    """
+    data = signal._data
+    if signal._categories is not None:
+        return signal._categories.astype(str)[data]
+    if data.dtype.kind in 'iuU':
+        return data
+    return np.array([str(x) for x in data.tolist()], dtype=str)
+
+def _compare(expected : Signal, actual : Signal) -> np.ndarray:
+    """
+    Compare two signals sample by sample
+
+    A sample is valid if
+    - the expected level is Level.UNKNOWN (don't care)
+    - both are the same logic level (Level, 0 / 1 or '0' / '1')
+    - both have the same value (ints and strings are compared by their text)
+
+    Returns
+    -------
+    valid : np.ndarray
+        bool array, True where the actual signal matches the expected one
+    """
+    valid = expected._levels == Level.UNKNOWN.value
+
+    eLogic, aLogic = _logic(expected), _logic(actual)
+    valid |= (eLogic >= 0) & (eLogic == aLogic)
+
+    bothData = (expected._levels == DATA) & (actual._levels == DATA) & ~valid
+    if np.any(bothData):
+        eKeys, aKeys = _keys(expected)[bothData], _keys(actual)[bothData]
+        if eKeys.dtype.kind != aKeys.dtype.kind:
+            # Compare ints and strings by their text
+            eKeys, aKeys = eKeys.astype(str), aKeys.astype(str)
+        valid[bothData] = eKeys == aKeys
+
+    return valid
+
+def _ranges(mask : np.ndarray) -> "list[tuple[int, int]]":
+    """
+    Return the (start, stop) ranges where mask is True
+    """
+    edges = np.diff(mask.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    return list(zip(starts.tolist(), stops.tolist()))
 
 class SignalChecker:
     def __init__(self, expectedValues : Signal, actualValues : Signal):
@@ -40,31 +147,46 @@ class SignalChecker:
 
     def message(self):
         if self._expected:
-            return f"Signal '{self._actual.name}' doesn't match '{self._expected.name}'"
+            return f"Signal '{self._actual.name}' doesn't match '{self._expected.name}' (first mismatch at cycle {self.firstMismatch()}, {len(self._mismatchRanges)} mismatching range(s))"
         else:
             return f"Signal '{self._actual.name}' isn't checked"
 
+    @profiling.timed('signal.check')
     def _evalValid(self):
-        HIGHS = ['1', 1, Level.HIGH]
-        LOWS = ['0', 0, Level.LOW]
-
-        self.valid_list = np.zeros(len(self._actual), dtype=bool)
         if len(self._expected) != len(self._actual):
             raise ValueError(f"Actual values aren't the same length ({len(self._actual)}) as expected ({len(self._expected)})")
-        else:
-            for i, (e, a) in enumerate(zip(self._expected, self._actual)):
-                if e._value == Level.UNKNOWN:
-                    # If there's no expected value, return true
-                    self.valid_list[i] = True
-                elif (e._value in HIGHS and a._value in HIGHS) or (e._value in LOWS and a._value in LOWS):
-                    # If there are both the same logic level (in any way)
-                    self.valid_list[i] = True
-                elif e._value == a._value:
-                    # If there are the same
-                    self.valid_list[i] = True
+
+        # Compared chunk by chunk so that long (memory-mapped) signals are never converted at once
+        N = len(self._expected)
+        self.valid_list = np.empty(N, dtype=bool)
+        for start in range(0, N, _CHECK_CHUNK):
+            stop = min(start + _CHECK_CHUNK, N)
+            self.valid_list[start:stop] = _compare(self._expected.window(start, stop), self._actual.window(start, stop))
+        self._mismatchRanges = _ranges(~self.valid_list)
 
         return np.all(self.valid_list)
 
+    def firstMismatch(self):
+        """
+        Return the first cycle where the actual signal doesn't match the expected signal (None if they match)
+        """
+        if not self._isChecked or len(self._mismatchRanges) == 0:
+            return None
+        return self._mismatchRanges[0][0]
+
+    def mismatchRanges(self) -> "list[tuple[int, int]]":
+        """
+        Return the ranges of cycles where the actual signal doesn't match the expected signal
+
+        Returns
+        -------
+        ranges : list[tuple[int, int]]
+            (start, stop) of each range, stop is excluded
+        """
+        if not self._isChecked:
+            return []
+        return self._mismatchRanges
+
     def print(self, print_values = False):
         """
         Prints information about the signal
@@ -110,9 +232,94 @@ class SignalChecker:
             c.print(f"{'actual':<8s} ={arrays_str}", style='violet', highlight=False)
 
 
+class WindowedSignalChecker:
+    def __init__(self, name : str, isChecked : bool):
+        """
+        Result of a signal checked window by window (see Testbench.runWindowed)
+
+        Only the mismatch ranges and the first failing window are kept
+
+        Parameters
+        ----------
+        name : str
+            Name of the actual signal
+        isChecked : bool
+            The signal has an expected signal
+        """
+        self.name = name
+        self._isChecked = isChecked
+        self._mismatchRanges = []
+        # SignalChecker of the first window with a mismatch (and its first cycle)
+        self._failedWindow = None
+        self._failedStart = None
+        # Number of cycles checked
+        self.length = 0
+
+    def add(self, checker : SignalChecker, start : int):
+        """
+        Add the result of a window starting at cycle start
+        """
+        for first, last in checker.mismatchRanges():
+            first, last = first + start, last + start
+            if self._mismatchRanges and self._mismatchRanges[-1][1] == first:
+                # The range continues over the previous window
+                self._mismatchRanges[-1] = (self._mismatchRanges[-1][0], last)
+            else:
+                self._mismatchRanges.append((first, last))
+        if self._isChecked and not checker.isValid() and self._failedWindow is None:
+            self._failedWindow = checker
+            self._failedStart = start
+        self.length = max(self.length, start + len(checker._actual))
+
+    def isValid(self):
+        return self._isChecked and len(self._mismatchRanges) == 0
+
+    def isChecked(self):
+        return self._isChecked
+
+    def message(self):
+        if self._isChecked:
+            return f"Signal '{self.name}' doesn't match its expected signal (first mismatch at cycle {self.firstMismatch()}, {len(self._mismatchRanges)} mismatching range(s))"
+        else:
+            return f"Signal '{self.name}' isn't checked"
+
+    def firstMismatch(self):
+        """
+        Return the first cycle where the actual signal doesn't match the expected signal (None if they match)
+        """
+        if len(self._mismatchRanges) == 0:
+            return None
+        return self._mismatchRanges[0][0]
+
+    def mismatchRanges(self) -> "list[tuple[int, int]]":
+        """
+        Return the ranges of cycles where the actual signal doesn't match the expected signal
+
+        Returns
+        -------
+        ranges : list[tuple[int, int]]
+            (start, stop) of each range, stop is excluded
+        """
+        return self._mismatchRanges
+
+    def print(self, print_values = False):
+        """
+        Prints the pass-fail report of the signal, the values of the first
+        failing window are printed
+        """
+        c = Console()
+        if not self._isChecked:
+            c.print(f"❔  {self.name} ({self.length} cycles)", style='bold violet')
+        elif self.isValid():
+            c.print(f"✅ {self.name} ({self.length} cycles)", style='bold green')
+        else:
+            self._failedWindow.printPassFail(True)
+            c.print(f"{'cycles':<8s} = {self._failedStart} to {self._failedStart + len(self._failedWindow._actual)}", highlight=False)
+
+
 class Testbench:
     __test__ = False # This is to prevent pytest from considering this class as  a test class
-    def __init__(self, file : str, entity : str, verbose : bool = False) -> None:
+    def __init__(self, file : str, entity : str, verbose : bool = False, pool : ClashiPool = None, engine : Engine = Engine.CLASHI, domain : str = DEFAULT_DOMAIN) -> None:
         """
         Testbench generator
 
@@ -124,6 +331,13 @@ class Testbench:
             Name of the entity
         verbose : bool
             Print debug information
+        pool : ClashiPool
+            Pool providing the clashi sessions, the process-wide pool is used if None
+        engine : Engine
+            Interpreted (Engine.CLASHI, default) or compiled (Engine.COMPILED) simulation
+        domain : str
+            Clock domain the entity is simulated in (System by default), other
+            domains must be defined in the file (createDomain)
         """
         # File
         if not exists(file):
@@ -134,8 +348,17 @@ class Testbench:
         self._lengths = {}
         self.inputSignals = {}
         self._expectedOutputSignals = {}
+        # Expected outputs given by name (matched with the actual outputs names when the testbench runs)
+        self._expectedByName = None
         self.actualOutputNames = []
         self._verbose = verbose
+        self._pool = pool
+        self.engine = engine
+        self.domain = domain
+        self._compiled = None
+        self.seed = None
+        # Timers and counters of the last run (see profiling)
+        self.profile = None
 
     def _add_lengths(self, signals : "list[Signal]"):
         self._lengths |= {s.name : len(s) for s in signals if (s is not None) and (len(s) > 1)}
@@ -172,14 +395,30 @@ class Testbench:
     def setExpectedOutputs(self, signals : "list[Signal]"):
         """
         Add the testbench outputs
+
+        Parameters
+        ----------
+        signals : list[Signal], dict or str
+            Expected outputs, in the order of the actual outputs (list), by
+            name (dict) or a golden binary trace directory (see trace.loadTrace).
+            The names must match the actual outputs names (None names excepted)
+            The signals of a trace are memory-mapped, they are compared chunk by
+            chunk without being loaded entirely
         """
+        if isinstance(signals, str):
+            signals = loadTrace(signals)
+        if signals == {}:
+            raise ValueError("Inputs cannot be empty")
+        if isinstance(signals, dict):
+            self._expectedByName = signals
+            signals = list(signals.values())
+        else:
+            self._expectedByName = None
+
         # CHeck if all the signals are the same length
         self._add_lengths(signals)
         self.N = self._check_lengths()
 
-        if signals == {}:
-            raise ValueError("Inputs cannot be empty")
-
         self._expectedOutputSignals = signals
 
     def setActualOutputsNames(self, signalsNames : "list[str]"):
@@ -193,6 +432,14 @@ class Testbench:
         """
         Fit all constant signals to size N (create their values vector)
         """
+        if self._expectedByName is not None:
+            declared = [name for name in self.actualOutputNames if name is not None]
+            unmatched = [name for name in self._expectedByName if name not in declared]
+            missing = [name for name in declared if name not in self._expectedByName]
+            if unmatched or missing:
+                # Otherwise the outputs would silently be left unchecked
+                raise ValueError(f"The expected outputs don't match the actual outputs names : expected outputs without actual output {unmatched}, actual outputs without expected output {missing}")
+            self._expectedOutputSignals = [None if name is None else self._expectedByName[name] for name in self.actualOutputNames]
 
         for l in [self.inputSignals, self._expectedOutputSignals]:
             for s in l:
@@ -201,14 +448,96 @@ class Testbench:
                         s.fit(self.N)
 
 
-    def run(self):
+    @profiling.profiled
+    def run(self, unknown : Unknown = Unknown.RANDOM, seed : int = None, stimulus : "Stimulus" = None, cache : ResultCache = None):
+        """
+        Run the testbench
 
-        self._clashi = Clashi(self._file, self._verbose)
+        Parameters
+        ----------
+        unknown : Unknown
+            How the Level.UNKNOWN input samples are resolved (zero, one or random)
+        seed : int
+            Seed of the random resolution. If None, a new seed is drawn. The seed
+            used is stored in Testbench.seed so that a run can be reproduced
+        stimulus : Stimulus
+            How the inputs are given to clashi, Stimulus.LIST (default) or Stimulus.FILE.
+            The compiled engine only supports (and defaults to) Stimulus.FILE
+        cache : ResultCache
+            If given, the outputs are taken from the cache when the sources, inputs
+            and number of cycles haven't changed (and stored in it otherwise)
+        """
+        stimulus = self._stimulus(stimulus)
+        with (TemporaryDirectory(prefix='clash_testbench_') if stimulus == Stimulus.FILE else nullcontext()) as directory:
+            job, key, testbenchOutput = self._prepare(unknown, seed, stimulus, cache, directory)
+            hit = testbenchOutput is not None
+            if not hit:
+                with profiling.timer('testbench.simulation'), self._session() as clashi:
+                    if job.files is not None:
+                        testbenchOutput = clashi.sampleNFromFiles(job.N, job.entity, job.files, job.singleOutput, job.domain)
+                    else:
+                        testbenchOutput = clashi.sampleN(job.N, job.entity, job.inputs, job.singleOutput, job.domain)
+        self._setOutputs(testbenchOutput, cache, key, hit)
+
+    def _stimulus(self, stimulus : "Stimulus") -> "Stimulus":
+        """
+        Return the stimulus used by a run (the default one of the engine if None)
+        """
+        if stimulus is None:
+            stimulus = Stimulus.FILE if self.engine == Engine.COMPILED else Stimulus.LIST
+        if self.engine == Engine.COMPILED and stimulus != Stimulus.FILE:
+            raise ValueError("The compiled engine only supports Stimulus.FILE")
+        if stimulus not in (Stimulus.FILE, Stimulus.LIST):
+            raise ValueError(f"Invalid stimulus : {stimulus}")
+        return stimulus
+
+    def _prepare(self, unknown : Unknown, seed : int, stimulus : "Stimulus", cache : ResultCache, directory : str) -> "tuple[SampleNJob, str, list[np.ndarray]]":
+        """
+        Resolve the inputs of a run and look its outputs up in the cache
+
+        Returns
+        -------
+        job : SampleNJob
+            Simulation of the run (with files in the directory for Stimulus.FILE)
+        key : str
+            Cache key (None without cache)
+        outputs : list[np.ndarray]
+            Outputs found in the cache, None if they must be simulated
+        """
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self._print_verbose(f"[Testbench] Unknown inputs resolved with {unknown} (seed = {seed})")
+        rng = np.random.default_rng(seed)
         # Sample the testbench
         self._fit_constant_signals()
-        input_list = ' '.join([f"(fromList [{','.join([str(v) for v in s.values()])}])" for s in self.inputSignals])
-
-        testbenchOutput = self._clashi.sampleN(self.N, self.entity, input_list, len(self.actualOutputNames) == 1)
+        singleOutput = len(self.actualOutputNames) == 1
+
+        key = None
+        if stimulus == Stimulus.FILE:
+            with profiling.timer('testbench.stimulus'):
+                files = self._writeInputFiles(directory, unknown, rng)
+            job = SampleNJob(self.N, self.entity, singleOutput=singleOutput, domain=self.domain, files=files)
+            if cache is not None:
+                key = cache.key(self._file, self.entity, self.N, [_readChunks(f) for f in files], singleOutput, self.domain)
+        else:
+            with profiling.timer('testbench.stimulus'):
+                values = [[str(v) for v in s.values(unknown, rng)] for s in self.inputSignals]
+            input_list = ' '.join([f"(fromList [{','.join(v)}])" for v in values])
+            job = SampleNJob(self.N, self.entity, input_list, singleOutput, self.domain)
+            if cache is not None:
+                key = cache.key(self._file, self.entity, self.N, ['\n'.join(v) for v in values], singleOutput, self.domain)
+        return job, key, None if cache is None else cache.get(key)
+
+    def _setOutputs(self, testbenchOutput : "list[np.ndarray]", cache : ResultCache, key : str, hit : bool):
+        """
+        Store the outputs of a run (in the cache too) and create the signal checkers
+        """
+        if cache is not None:
+            if hit:
+                self._print_verbose(f"[Testbench] Outputs taken from the cache ({key})")
+            else:
+                cache.put(key, testbenchOutput)
 
         self._pairs = []
 
@@ -219,7 +548,7 @@ class Testbench:
         for i, (tbOut, name) in enumerate(zip(testbenchOutput, self.actualOutputNames)):
             if name is not None:
                 act = Signal(name)
-                act.fromList(tbOut)
+                act.fromColumn(decodeColumn(tbOut), tbOut)
                 self._actualOutputs[name] = act
                 if i < len(self._expectedOutputSignals):
                     # Do a comparison
@@ -229,6 +558,158 @@ class Testbench:
                     exp = None
                 self._pairs.append(SignalChecker(exp, act))
 
+    @contextmanager
+    def _session(self):
+        """
+        Clashi session (from the pool) or compiled backend, depending on the engine
+        """
+        if self.engine == Engine.COMPILED:
+            if self._compiled is None:
+                self._compiled = CompiledClashi(self._file, self._verbose)
+            yield self._compiled
+        else:
+            pool = defaultPool() if self._pool is None else self._pool
+            with pool.session(self._file, self._verbose) as clashi:
+                yield clashi
+
+    def _writeInputFiles(self, directory : str, unknown : Unknown, rng : np.random.Generator) -> "list[str]":
+        """
+        Write each input signal to a file (one value per line), _WRITE_CHUNK samples at a time
+        """
+        files = []
+        for i, signal in enumerate(self.inputSignals):
+            files.append(join(directory, f'input_{i}.txt'))
+            with open(files[-1], 'w', encoding='utf-8') as f:
+                for start in range(0, len(signal), _WRITE_CHUNK):
+                    values = signal.window(start, start + _WRITE_CHUNK).values(unknown, rng)
+                    f.write(('\n' if start > 0 else '') + '\n'.join(map(str, values)))
+        return files
+
+    @profiling.profiled
+    def runWindowed(self, window : int, unknown : Unknown = Unknown.RANDOM, seed : int = None, stopOnMismatch : bool = True, trace : str = None):
+        """
+        Run the testbench window by window
+
+        The simulation runs in a single clashi session, each window continues
+        where the previous one stopped (the circuit state is kept). The outputs
+        of a window are checked and dropped before the next one is read, so that the
+        memory used doesn't depend on the number of cycles. The actual outputs
+        aren't kept (actualOutputs() is empty), use trace to save them.
+        The inputs are given with files (see Stimulus.FILE)
+
+        Parameters
+        ----------
+        window : int
+            Number of cycles simulated at once
+        unknown : Unknown
+            How the Level.UNKNOWN input samples are resolved (zero, one or random)
+        seed : int
+            Seed of the random resolution. If None, a new seed is drawn and stored in Testbench.seed
+        stopOnMismatch : bool
+            Stop the simulation after the first window with a mismatch (default)
+        trace : str
+            Path of a file where the actual outputs are written :
+            - a VCD file if it ends with .vcd
+            - a binary trace directory (see trace.loadTrace) if it ends with .trace
+            - a tab-separated file otherwise (one line per cycle, the first line has the output names)
+        """
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        if self.engine != Engine.CLASHI:
+            raise ValueError("Windowed runs are only supported by the clashi engine")
+        pool = defaultPool() if self._pool is None else self._pool
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self._print_verbose(f"[Testbench] Windows of {window} cycles, unknown inputs resolved with {unknown} (seed = {seed})")
+        rng = np.random.default_rng(seed)
+        self._fit_constant_signals()
+        singleOutput = len(self.actualOutputNames) == 1
+
+        self._actualOutputs = {}
+        self._pairs = [WindowedSignalChecker(name, i < len(self._expectedOutputSignals) and self._expectedOutputSignals[i] is not None)
+            for i, name in enumerate(self.actualOutputNames) if name is not None]
+
+        binaryTrace = trace is not None and (trace.endswith('.vcd') or trace.endswith(TRACE_EXTENSION))
+        traceFile = open(trace, 'w', encoding='utf-8') if trace is not None and not binaryTrace else None
+        try:
+            if traceFile is not None:
+                traceFile.write('\t'.join(str(name) for name in self.actualOutputNames) + '\n')
+            with TemporaryDirectory(prefix='clash_testbench_') as directory:
+                traceWriter = None
+                if binaryTrace:
+                    # The VCD file is written from a binary trace at the end of the simulation
+                    traceWriter = TraceWriter(trace if trace.endswith(TRACE_EXTENSION) else join(directory, 'outputs' + TRACE_EXTENSION))
+                try:
+                    with profiling.timer('testbench.stimulus'):
+                        files = self._writeInputFiles(directory, unknown, rng)
+                    with pool.session(self._file, self._verbose) as clashi:
+                        clashi.startSimulation(self.entity, files, self.domain)
+                        try:
+                            for start in range(0, self.N, window):
+                                stop = min(start + window, self.N)
+                                testbenchOutput = clashi.sampleNext(stop - start, singleOutput)
+                                if len(testbenchOutput) != len(self.actualOutputNames):
+                                    raise ValueError(f"Number of actual outputs ({len(testbenchOutput)}) doesn't match what was declared ({len(self.actualOutputNames)})")
+                                if any(len(tbOut) != stop - start for tbOut in testbenchOutput):
+                                    raise ValueError(f"clashi returned less than {stop - start} samples for cycles {start} to {stop}")
+                                self._print_verbose(f"[Testbench] Cycles {start} to {stop}")
+
+                                if traceFile is not None:
+                                    traceFile.write(''.join('\t'.join(row) + '\n' for row in zip(*[tbOut.tolist() for tbOut in testbenchOutput])))
+
+                                checkers = iter(self._pairs)
+                                actuals = []
+                                for i, (tbOut, name) in enumerate(zip(testbenchOutput, self.actualOutputNames)):
+                                    if name is not None:
+                                        act = Signal(name)
+                                        act.fromColumn(decodeColumn(tbOut), tbOut)
+                                        actuals.append(act)
+                                        exp = None
+                                        if i < len(self._expectedOutputSignals) and self._expectedOutputSignals[i] is not None:
+                                            exp = self._expectedOutputSignals[i].window(start, stop)
+                                        next(checkers).add(SignalChecker(exp, act), start)
+                                if traceWriter is not None:
+                                    traceWriter.append(actuals)
+
+                                if stopOnMismatch and not all(c.isValid() for c in self._pairs if c.isChecked()):
+                                    break
+                        except BaseException:
+                            # The session may be broken, an error while stopping mustn't hide the original one
+                            try:
+                                clashi.stopSimulation()
+                            except Exception as e:
+                                self._print_verbose(f"[Testbench] Couldn't stop the simulation : {e!r}")
+                            raise
+                        else:
+                            clashi.stopSimulation()
+                except BaseException:
+                    if traceWriter is not None:
+                        # The partial trace is kept (it matters most when the run fails)
+                        try:
+                            self._closeTrace(traceWriter, trace)
+                        except Exception as e:
+                            self._print_verbose(f"[Testbench] Couldn't write the trace : {e!r}")
+                    raise
+                if traceWriter is not None:
+                    self._closeTrace(traceWriter, trace)
+        finally:
+            if traceFile is not None:
+                traceFile.close()
+
+    @staticmethod
+    def _closeTrace(traceWriter : TraceWriter, trace : str):
+        """
+        Close the binary trace of a windowed run (and write the VCD file from it)
+        """
+        traceWriter.close()
+        if trace.endswith('.vcd'):
+            writeVCD(trace, loadTrace(traceWriter.directory))
+
+    def _print_verbose(self, x):
+        if self._verbose:
+            print(x)
+
     def actualOutputs(self):
         """
         Return actual outputs
@@ -242,6 +723,26 @@ class Testbench:
 
         return {signal.name : signal for signal in self.inputSignals + self._expectedOutputSignals if signal is not None} | self._actualOutputs
 
+    def saveVCD(self, output_file : str):
+        """
+        Save all the testbench signals (inputs, expected and actual outputs) to a VCD file
+
+        Parameters
+        ----------
+        output_file : str
+        """
+        writeVCD(output_file, self.getAllSignals())
+
+    def saveTrace(self, directory : str):
+        """
+        Save all the testbench signals (inputs, expected and actual outputs) to a binary trace directory
+
+        Parameters
+        ----------
+        directory : str
+        """
+        saveTrace(directory, self.getAllSignals())
+
 
 
     def __iter__(self) -> Iterator[Signal]:
@@ -251,7 +752,105 @@ class Testbench:
     def __next__(self) -> Signal:
         return next(self._signals_iter)
 
-    
-        
-
 
+def _defaultWorkers():
+    """
+    Number of workers used by runMany() when none is given.
+    When running under pytest-xdist, the cores are split between the xdist workers
+    """
+    xdistWorkers = int(environ.get('PYTEST_XDIST_WORKER_COUNT', 1))
+    return max(1, (cpu_count() or 1) // max(1, xdistWorkers))
+
+def runMany(testbenches : "list[Testbench]", workers : int = None) -> "list[list[SignalChecker]]":
+    """
+    Run multiple independent testbenches in parallel, each one on its own clashi session
+
+    The number of simultaneous clashi processes is limited by the pool of each
+    testbench, its maxSessions is raised to the number of workers during the
+    call if necessary (and restored afterwards)
+
+    Parameters
+    ----------
+    testbenches : list[Testbench]
+    workers : int
+        Number of testbenches running at the same time. If None, the number of
+        cores (divided by the number of pytest-xdist workers, if any) is used
+
+    Returns
+    -------
+    results : list[list[SignalChecker]]
+        Signal checkers of each testbench, in the same order as the testbenches
+    """
+    if workers is None:
+        workers = _defaultWorkers()
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+
+    # {id(pool) : (pool, maxSessions before the call)}
+    pools = {}
+    for tb in testbenches:
+        pool = defaultPool() if tb._pool is None else tb._pool
+        pools.setdefault(id(pool), (pool, pool.maxSessions))
+
+    try:
+        for pool, maxSessions in pools.values():
+            pool._resize(max(maxSessions, workers))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map() gives the results back in submission order (and re-raises the first error)
+            list(executor.map(Testbench.run, testbenches))
+    finally:
+        # The pools are shared, the extra sessions mustn't outlive the call
+        for pool, maxSessions in pools.values():
+            pool._resize(maxSessions)
+
+    return [tb._pairs for tb in testbenches]
+
+def runBatch(testbenches : "list[Testbench]", unknown : Unknown = Unknown.RANDOM, seed : int = None, stimulus : "Stimulus" = None, cache : ResultCache = None) -> "list[list[SignalChecker]]":
+    """
+    Run multiple testbenches with a single clashi command per file
+
+    The testbenches of the same file (and pool) are simulated by one command on
+    one session (see Clashi.sampleNMany), whatever their entities and clock
+    domains, so that many small testbenches don't pay a clashi round-trip each.
+    Only the clashi engine is supported
+
+    Parameters
+    ----------
+    testbenches : list[Testbench]
+    unknown, seed, stimulus, cache
+        Given to each testbench, see Testbench.run
+
+    Returns
+    -------
+    results : list[list[SignalChecker]]
+        Signal checkers of each testbench, in the same order as the testbenches
+    """
+    for tb in testbenches:
+        if tb.engine != Engine.CLASHI:
+            raise ValueError("Batched runs are only supported by the clashi engine")
+
+    with ExitStack() as stack:
+        # {(file, pool) : [(testbench, job, key)]} of the testbenches that must be simulated
+        groups = {}
+        outputs = {}
+        for tb in testbenches:
+            tbStimulus = tb._stimulus(stimulus)
+            directory = stack.enter_context(TemporaryDirectory(prefix='clash_testbench_')) if tbStimulus == Stimulus.FILE else None
+            job, key, testbenchOutput = tb._prepare(unknown, seed, tbStimulus, cache, directory)
+            if testbenchOutput is None:
+                pool = defaultPool() if tb._pool is None else tb._pool
+                groups.setdefault((abspath(tb._file), pool), []).append((tb, job, key))
+            else:
+                outputs[id(tb)] = (testbenchOutput, key, True)
+
+        for (_, pool), group in groups.items():
+            with profiling.timer('testbench.simulation'), pool.session(group[0][0]._file, any(tb._verbose for tb, _, _ in group)) as clashi:
+                results = clashi.sampleNMany([job for _, job, _ in group])
+            for (tb, _, key), testbenchOutput in zip(group, results):
+                outputs[id(tb)] = (testbenchOutput, key, False)
+
+    for tb in testbenches:
+        testbenchOutput, key, hit = outputs[id(tb)]
+        tb._setOutputs(testbenchOutput, cache, key, hit)
+
+    return [tb._pairs for tb in testbenches]
@@ -0,0 +1,436 @@
+# Trace files
+#
+# Store signals outside of the wavedrom description :
+# - a columnar binary format : a directory with the raw arrays of each signal
+#   (.bin files) and a JSON index. Signals can be appended window by window while
+#   a simulation runs and they are loaded back as memory-mapped arrays (only the
+#   samples that are accessed are read)
+# - VCD (Value Change Dump), opened by the usual waveform viewers (GTKWave, ...)
+
+import json
+from os import makedirs
+from os.path import join
+import numpy as np
+
+from .logic import Signal, Level, DATA, _dataArray
+
+# Changed whenever the layout of the binary traces changes
+TRACE_FORMAT = 1
+# Extension of the binary trace directories (see Testbench.runWindowed)
+TRACE_EXTENSION = '.trace'
+
+_INDEX = 'index.json'
+# Arrays of each signal (name, dtype)
+_ARRAYS = [('levels', np.uint8), ('data', np.int64), ('colors', np.uint8)]
+# Number of samples converted to VCD value changes at once
+_VCD_CHUNK = 1 << 16
+_VCD_TIMESCALE = '1 ns'
+_VCD_SCOPE = 'testbench'
+# Symbol of the logic levels in the VCD values
+_VCD_LEVELS = {Level.LOW.value : '0', Level.HIGH.value : '1', Level.UNKNOWN.value : 'x'}
+_VCD_SCALARS = {'0' : Level.LOW, '1' : Level.HIGH, 'x' : Level.UNKNOWN, 'z' : Level.UNKNOWN}
+
+def _values(signal : Signal) -> np.ndarray:
+    """
+    Data of the samples of a signal (with the categories resolved)
+    """
+    return signal._data if signal._categories is None else signal._categories[signal._data]
+
+def _signalList(signals) -> "list[Signal]":
+    return list(signals.values()) if isinstance(signals, dict) else list(signals)
+
+class TraceWriter:
+    def __init__(self, directory : str) -> None:
+        """
+        Write signals to a binary trace directory, window by window
+
+        Each signal is stored as three raw arrays (levels, data and colors, see
+        Signal). Integer data are stored as is, other values (strings, enums,
+        big integers) as indices into a list of categories saved in the index.
+        The index is written by close()
+
+        with TraceWriter('outputs.trace') as writer:
+            for window in ...:
+                writer.append(signals)
+
+        Parameters
+        ----------
+        directory : str
+            Trace directory (created if needed)
+        """
+        makedirs(directory, exist_ok=True)
+        self.directory = directory
+        # Index entry of each signal
+        self._signals = []
+        # {value : category index} of each signal
+        self._lookups = []
+        # Open files (levels, data, colors) of each signal
+        self._files = []
+        self._names = {}
+
+    def _path(self, i : int, array : str) -> str:
+        return join(self.directory, f'{i}.{array}.bin')
+
+    def append(self, signals):
+        """
+        Append samples to the trace
+
+        Parameters
+        ----------
+        signals : list[Signal] or dict
+            Samples of each signal, the signals are identified by their name
+        """
+        for signal in _signalList(signals):
+            self._append(signal)
+
+    def _append(self, signal : Signal):
+        if signal.name not in self._names:
+            self._names[signal.name] = len(self._signals)
+            self._signals.append({'name' : signal.name, 'kind' : None, 'length' : 0})
+            self._lookups.append({})
+            self._files.append([open(self._path(len(self._files), array), 'wb') for array, _ in _ARRAYS])
+        i = self._names[signal.name]
+        info = self._signals[i]
+        if len(signal) == 0:
+            return
+
+        values = _values(signal)
+        if info['kind'] is None:
+            info['kind'] = 'int' if values.dtype == np.int64 else 'categories'
+        elif info['kind'] == 'int' and values.dtype != np.int64:
+            self._categorize(i)
+
+        data = values if info['kind'] == 'int' else self._codes(i, signal._levels, values)
+        levelsFile, dataFile, colorsFile = self._files[i]
+        np.ascontiguousarray(signal._levels, dtype=np.uint8).tofile(levelsFile)
+        np.ascontiguousarray(data, dtype=np.int64).tofile(dataFile)
+        np.ascontiguousarray(signal._colors, dtype=np.uint8).tofile(colorsFile)
+        info['length'] += len(signal)
+
+    def _codes(self, i : int, levels : np.ndarray, values : np.ndarray) -> np.ndarray:
+        """
+        Category indices of the values (0 for the samples without data)
+        """
+        lookup = self._lookups[i]
+        isData = levels == DATA
+        codes = np.zeros(len(levels), dtype=np.int64)
+        values = values[isData]
+        if values.dtype.kind in 'iuU':
+            unique, inverse = np.unique(values, return_inverse=True)
+            uniqueCodes = np.array([lookup.setdefault(v, len(lookup)) for v in unique.tolist()], dtype=np.int64)
+            codes[isData] = uniqueCodes[inverse]
+        else:
+            codes[isData] = [lookup.setdefault(v.item() if isinstance(v, np.generic) else v, len(lookup)) for v in values.tolist()]
+        return codes
+
+    def _categorize(self, i : int):
+        """
+        Store the data of an integer signal as categories (when other values are appended)
+        """
+        for f in self._files[i]:
+            f.flush()
+        levels = np.fromfile(self._path(i, 'levels'), dtype=np.uint8)
+        data = np.fromfile(self._path(i, 'data'), dtype=np.int64)
+        self._files[i][1].close()
+        codes = self._codes(i, levels, data)
+        self._files[i][1] = open(self._path(i, 'data'), 'wb')
+        codes.tofile(self._files[i][1])
+        self._signals[i]['kind'] = 'categories'
+
+    def close(self):
+        """
+        Close the files and write the index
+        """
+        for files in self._files:
+            for f in files:
+                f.close()
+        self._files = [[] for _ in self._files]
+        index = {
+            'format' : TRACE_FORMAT,
+            'signals' : [dict(info, kind=info['kind'] or 'int', categories=list(lookup)) for info, lookup in zip(self._signals, self._lookups)]
+        }
+        with open(join(self.directory, _INDEX), 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _mapArray(path : str, dtype, N : int) -> np.ndarray:
+    if N == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(N,))
+
+def saveTrace(directory : str, signals):
+    """
+    Save signals to a binary trace directory (see TraceWriter)
+
+    Parameters
+    ----------
+    directory : str
+    signals : list[Signal] or dict
+    """
+    with TraceWriter(directory) as writer:
+        writer.append(signals)
+
+def loadTrace(directory : str) -> "dict[str, Signal]":
+    """
+    Load the signals of a binary trace directory
+
+    The arrays are memory-mapped : the samples are read from the disk when they
+    are accessed and the signals are copied before being modified
+
+    Parameters
+    ----------
+    directory : str
+
+    Returns
+    -------
+    signals : dict
+        {name : Signal}
+    """
+    with open(join(directory, _INDEX), encoding='utf-8') as f:
+        index = json.load(f)
+    if index.get('format') != TRACE_FORMAT:
+        raise ValueError(f"Unsupported trace format : {index.get('format')} (expected {TRACE_FORMAT})")
+
+    signals = {}
+    for i, info in enumerate(index['signals']):
+        arrays = [_mapArray(join(directory, f'{i}.{array}.bin'), dtype, info['length']) for array, dtype in _ARRAYS]
+        categories = None
+        if info['kind'] == 'categories':
+            # At least one category, the samples without data point to the first one
+            categories = _dataArray(info['categories'] or [''])
+        signal = Signal(info['name'])
+        signal._setArrays(*arrays, categories, shared=True)
+        signals[info['name']] = signal
+    return signals
+
+
+def _vcdIdentifier(k : int) -> str:
+    """
+    Short identifier of the k-th VCD variable (printable characters)
+    """
+    identifier = ''
+    while True:
+        identifier += chr(33 + k % 94)
+        k //= 94
+        if k == 0:
+            return identifier
+
+def _vcdType(signal : Signal) -> "tuple[str, int]":
+    """
+    Return the VCD type of a signal and its width
+    - wire of width 1 : logic levels and 0 / 1 values
+    - wire of width n : integers (two's complement if some are negative)
+    - string : anything else
+    """
+    low, high = 0, 1
+    for start in range(0, len(signal), _VCD_CHUNK):
+        window = signal.window(start, start + _VCD_CHUNK)
+        values = _values(window)[window._levels == DATA]
+        if len(values) == 0:
+            continue
+        integers = values.dtype.kind in 'iu' or (values.dtype.kind == 'O' and all(isinstance(v, (int, np.integer)) for v in values.tolist()))
+        if not integers:
+            if np.all(np.isin(values.astype(str), ['0', '1'])):
+                continue
+            return 'string', 1
+        low, high = min(low, int(values.min())), max(high, int(values.max()))
+
+    if low >= 0 and high <= 1:
+        return 'wire', 1
+    width = max(high.bit_length(), 1)
+    if low < 0:
+        width = max(width + 1, (-low - 1).bit_length() + 1)
+    return 'wire', width
+
+def _vcdChanges(signal : Signal, vcdType : str, width : int, identifier : str, start : int, stop : int):
+    """
+    Return the times and the value changes of a signal between start and stop
+    """
+    # The previous sample is included to detect a change at the start of the window
+    first = max(start - 1, 0)
+    window = signal.window(first, stop)
+    levels = np.asarray(window._levels)
+    values = _values(window)
+    isData = levels == DATA
+    change = np.ones(len(levels), dtype=bool)
+    change[1:] = (levels[1:] != levels[:-1]) | (isData[1:] & (values[1:] != values[:-1]))
+    if start > 0:
+        change[0] = False
+    indices = np.flatnonzero(change)
+
+    mask = (1 << width) - 1
+    texts = []
+    for level, value in zip(levels[indices].tolist(), values[indices].tolist()):
+        if level != DATA:
+            symbol = _VCD_LEVELS[level]
+        elif vcdType == 'string':
+            symbol = '_'.join(str(value).split())
+        else:
+            symbol = format(int(value) & mask, 'b')
+        if vcdType == 'string':
+            texts.append(f's{symbol} {identifier}')
+        elif width == 1:
+            texts.append(f'{symbol}{identifier}')
+        else:
+            texts.append(f'b{symbol} {identifier}')
+    return indices + first, texts
+
+def writeVCD(file : str, signals, timescale : str = _VCD_TIMESCALE):
+    """
+    Write signals to a VCD file, one cycle per time unit
+
+    Logic levels and 0 / 1 values are written as 1-bit wires, integers as
+    vectors and other values as strings (GTKWave extension, whitespaces are
+    replaced by '_'). Whitespaces in the names are also replaced by '_'.
+    The signals are converted chunk by chunk, so memory-mapped signals (see
+    loadTrace) aren't loaded entirely
+
+    Parameters
+    ----------
+    file : str
+        Output file path
+    signals : list[Signal] or dict
+    timescale : str
+        Duration of a cycle
+    """
+    signals = _signalList(signals)
+    variables = [(s, *_vcdType(s), _vcdIdentifier(k)) for k, s in enumerate(signals)]
+    N = max((len(s) for s in signals), default=0)
+
+    with open(file, 'w', encoding='utf-8') as f:
+        f.write(f'$timescale {timescale} $end\n$scope module {_VCD_SCOPE} $end\n')
+        for signal, vcdType, width, identifier in variables:
+            name = '_'.join(str(signal.name).split())
+            f.write(f'$var {vcdType} {width} {identifier} {name} $end\n')
+        f.write('$upscope $end\n$enddefinitions $end\n')
+
+        for start in range(0, N, _VCD_CHUNK):
+            stop = start + _VCD_CHUNK
+            times, texts = [], []
+            for signal, vcdType, width, identifier in variables:
+                if start < len(signal):
+                    t, x = _vcdChanges(signal, vcdType, width, identifier, start, min(stop, len(signal)))
+                    times.append(t)
+                    texts += x
+            if not texts:
+                continue
+            times = np.concatenate(times)
+            order = np.argsort(times, kind='stable')
+            lines = []
+            current = None
+            for t, i in zip(times[order].tolist(), order.tolist()):
+                if t != current:
+                    lines.append(f'#{t}')
+                    current = t
+                lines.append(texts[i])
+            f.write('\n'.join(lines) + '\n')
+        # End of the last cycle
+        f.write(f'#{N}\n')
+
+def _vcdValue(value : str, vcdType : str, width : int):
+    """
+    Convert a VCD value to a sample value
+    """
+    if vcdType == 'string':
+        return value
+    value = value.lower()
+    if width == 1 and value in _VCD_SCALARS:
+        return _VCD_SCALARS[value]
+    if all(c in '01' for c in value):
+        return int(value, 2)
+    if any(c in 'xz' for c in value):
+        return Level.UNKNOWN
+    # Real values
+    return value
+
+def readVCD(file : str) -> "dict[str, Signal]":
+    """
+    Read the signals of a VCD file, one sample per time unit
+
+    The names of the variables inside nested scopes are prefixed with the
+    scopes (except the top one). Vectors are read as unsigned integers
+
+    Parameters
+    ----------
+    file : str
+
+    Returns
+    -------
+    signals : dict
+        {name : Signal}
+    """
+    # {identifier : [name, type, width, times, values]}
+    variables = {}
+    with open(file, encoding='utf-8') as f:
+        tokens = iter(f.read().split())
+
+    # 1) Declarations
+    scopes = []
+    for token in tokens:
+        if token == '$enddefinitions':
+            break
+        if token == '$scope':
+            next(tokens)
+            scopes.append(next(tokens))
+        elif token == '$upscope':
+            scopes.pop()
+        elif token == '$var':
+            vcdType, width, identifier, name = next(tokens), next(tokens), next(tokens), next(tokens)
+            variables.setdefault(identifier, ['.'.join(scopes[1:] + [name]), vcdType, int(width), [], []])
+        if token.startswith('$') and token != '$end':
+            # Skip the rest of the declaration
+            for t in tokens:
+                if t == '$end':
+                    break
+
+    # 2) Value changes
+    time = 0
+    changed = False
+    for token in tokens:
+        c = token[0]
+        if c == '#':
+            time = int(token[1:])
+            changed = False
+            continue
+        if c == '$':
+            if token == '$comment':
+                for t in tokens:
+                    if t == '$end':
+                        break
+            continue
+        if c in 'bBrRsS':
+            value, identifier = token[1:], next(tokens)
+        else:
+            value, identifier = c, token[1:]
+        variable = variables.get(identifier)
+        if variable is None:
+            continue
+        changed = True
+        times, values = variable[3], variable[4]
+        if times and times[-1] == time:
+            values[-1] = value
+        else:
+            times.append(time)
+            values.append(value)
+    # The last timestamp ends the last cycle (unless it has value changes)
+    N = time + 1 if changed else time
+
+    # 3) Repeat the values until the next change
+    signals = {}
+    for name, vcdType, width, times, values in variables.values():
+        samples = [_vcdValue(v, vcdType, width) for v in values]
+        if not times or times[0] > 0:
+            times = [0] + times
+            samples = [Level.UNKNOWN] + samples
+        counts = np.diff(np.array(times + [max(N, times[-1] + 1)]))
+        runs = Signal(name, samples)
+        signal = Signal(name)
+        signal._setArrays(np.repeat(runs._levels, counts), np.repeat(runs._data, counts), np.repeat(runs._colors, counts))
+        signals[name] = signal
+    return signals
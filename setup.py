@@ -19,6 +19,10 @@ setup(
     long_description=long_description,
     packages=find_packages(),
     install_requires=['numpy', 'pytest', 'rich', 'wavedrom'],
+    entry_points={
+        # --clash-profile option
+        'pytest11' : ['clash_testbench = clash_testbench.pytest_plugin']
+    },
     keywords=['clash', 'clash-lang', 'testbench', 'haskell', 'HDL', 'VHDL', 'FPGA'],
     classifiers=[
         "Development Status :: 3 - Alpha",
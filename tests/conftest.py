@@ -0,0 +1,20 @@
+# Test configuration
+#
+# Tests that drive clashi without simulating anything use the fake clashi of
+# the benchmarks (benchmarks/fake_clashi.py) through the fakeClashi fixture
+
+from os.path import abspath, dirname, join
+from sys import executable
+import shlex
+
+import pytest
+
+FAKE_CLASHI = f'{shlex.quote(executable)} {shlex.quote(join(dirname(dirname(abspath(__file__))), "benchmarks", "fake_clashi.py"))}'
+
+@pytest.fixture
+def fakeClashi(monkeypatch):
+    """
+    Use the fake clashi during the test
+    """
+    monkeypatch.setenv('CLASH_TESTBENCH_CLASHI', FAKE_CLASHI)
+    return FAKE_CLASHI
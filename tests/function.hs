@@ -3,4 +3,14 @@ module Function where
 import Clash.Prelude
 
 functionA :: Unsigned 10 -> Unsigned 10
-functionA = (+1)
\ No newline at end of file
+functionA = (+1)
+data Pair = Pair { first :: Unsigned 10, second :: Unsigned 10 } deriving Show
+
+functionList :: Unsigned 10 -> [Unsigned 10]
+functionList x = [x, x + 1]
+
+functionVec :: Unsigned 10 -> Vec 2 (Unsigned 10)
+functionVec x = x :> x + 1 :> Nil
+
+functionRecord :: Unsigned 10 -> Pair
+functionRecord x = Pair { first = x, second = x + 1 }
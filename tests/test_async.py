@@ -0,0 +1,58 @@
+# Test the asyncio sessions (AsyncClashi) with the fake clashi
+#
+
+from os.path import abspath, dirname, join
+import asyncio
+
+import pytest
+
+from clash_testbench import AsyncClashi
+
+FILE = join(dirname(abspath(__file__)), 'function.hs')
+
+pytestmark = pytest.mark.usefixtures('fakeClashi')
+
+def _run(test):
+    """
+    Run test(session) on a new session, the session is closed afterwards
+    """
+    async def main():
+        clashi = await AsyncClashi.create(FILE)
+        try:
+            return await test(clashi)
+        finally:
+            clashi.close()
+    return asyncio.run(main())
+
+def test_gather():
+    async def main():
+        sessions = await asyncio.gather(*[AsyncClashi.create(FILE) for _ in range(3)])
+        try:
+            outputs = await asyncio.gather(*[s.testFunctionAsync('functionA', [str(i)]) for i, s in enumerate(sessions)])
+            samples = await asyncio.gather(*[s.sampleNAsync(10 * (i + 1), 'top', '', False) for i, s in enumerate(sessions)])
+        finally:
+            for s in sessions:
+                s.close()
+        return outputs, samples
+    outputs, samples = asyncio.run(main())
+    assert outputs == ['1', '2', '3']
+    assert [len(arrays[0]) for arrays in samples] == [10, 20, 30]
+    assert samples[0][2].tolist()[:4] == ['Idle', 'Read', 'Write', 'Wait']
+
+def test_timeout():
+    async def test(clashi):
+        with pytest.raises(TimeoutError):
+            await clashi.testFunctionAsync('sleep', ['10'], timeout=0.3)
+        # The session is back at the prompt
+        return await clashi.testFunctionAsync('functionA', ['1'], timeout=5)
+    assert _run(test) == '2'
+
+def test_cancel():
+    async def test(clashi):
+        task = asyncio.ensure_future(clashi.testFunctionAsync('sleep', ['10'], timeout=None))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await clashi.sampleNAsync(5, 'top', '', False, timeout=5)
+    assert [len(a) for a in _run(test)] == [5, 5, 5]
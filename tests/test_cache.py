@@ -0,0 +1,43 @@
+# Test the testbench result cache
+#
+
+from clash_testbench.cache import ResultCache
+import numpy as np
+import os
+import time
+
+def test_getPut(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    columns = [np.array(['0', '1']), np.array(['Idle', 'Read'])]
+    assert cache.get('k') is None
+    cache.put('k', columns)
+    assert [c.tolist() for c in cache.get('k')] == [c.tolist() for c in columns]
+
+def test_key(tmp_path):
+    source = tmp_path / 'A.hs'
+    imported = tmp_path / 'B.hs'
+    source.write_text('module A where\nimport B\n')
+    imported.write_text('module B where\n')
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = cache.key(str(source), 'top', 2, ['0\n1'], False)
+    # Inputs given as chunks
+    assert cache.key(str(source), 'top', 2, [iter(['0\n', '1'])], False) == key
+    assert cache.key(str(source), 'top', 2, ['1\n1'], False) != key
+    assert cache.key(str(source), 'other', 2, ['0\n1'], False) != key
+    imported.write_text('module B where\nx = 1\n')
+    assert cache.key(str(source), 'top', 2, ['0\n1'], False) != key
+
+def test_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    column = [np.array([str(i) for i in range(300)])]
+    cache.put('a', column)
+    size = os.path.getsize(tmp_path / 'a.npz')
+    cache.maxSize = 2 * size + size // 2
+    time.sleep(0.01)
+    cache.put('b', column)
+    time.sleep(0.01)
+    # a becomes the most recently used
+    cache.get('a')
+    time.sleep(0.01)
+    cache.put('c', column)
+    assert sorted(os.listdir(tmp_path)) == ['a.npz', 'c.npz']
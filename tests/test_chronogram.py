@@ -1,8 +1,8 @@
 from sys import path
 path.append('.')
 
-from clash_testbench import Chronogram
-from clash_testbench.chronogram import _compress, _uncompress, _signalToEntry
+from clash_testbench import Chronogram, Signal, saveSVGs
+from clash_testbench.chronogram import _compress, _uncompress, _signalToEntry, _selectEntry
 
 from os.path import dirname, join
 
@@ -39,6 +39,76 @@ def test_uncompress():
 
 
 
+def test_lazySignals():
+    cg = Chronogram(join(dirname(__file__), "test_chronogram.json"))
+    # Nothing is decoded when the file is loaded
+    assert cg._signals == {}
+    state = cg["state"]
+    assert list(cg._signals) == ["state"]
+    # Decoded once
+    assert cg["state"] is state
+    # The changes made to the returned signal are kept (the entry didn't change)
+    state[0] = "Changed"
+    assert cg["state"] is state
+    assert cg["state"][0].value() == "Changed"
+
+    cg["valid_i"] = Signal("valid_i", [1] * len(cg["valid_i"]))
+    # Only the modified entry is decoded again
+    assert cg["state"] is state
+    assert cg["valid_i"].values() == [1] * len(cg["valid_i"])
+
+    try:
+        cg["clk"]
+        assert False, "Clocks aren't signals"
+    except KeyError:
+        pass
+
+def test_entriesTree():
+    cg = Chronogram(join(dirname(__file__), "test_chronogram.json"))
+    del cg["ready_o"]
+    del cg["state"]
+    cg["new"] = Signal("new", [1, 0, 1])
+    # The tree is kept up to date without walking the description again
+    tree = {name : list(branch) for name, branch in cg._entriesTree.items()}
+    cg._updateEntriesTree()
+    assert tree == cg._entriesTree
+    assert "state" not in cg._entriesTree
+    assert cg["new"].values() == [1, 0, 1]
+
+    # Unchanged signals aren't encoded again
+    signals = cg.getSignals()
+    cg.setSignals(signals)
+    entry = cg._WDGetEntry(cg._entriesTree["valid_i"])
+    signals["data_i"][0] = 1
+    cg.setSignals(signals)
+    assert cg._WDGetEntry(cg._entriesTree["valid_i"]) is entry
+    assert cg["data_i"].values()[0] == 1
+
+def test_renderWindows():
+    cg = Chronogram()
+    cg.setSignals([Signal("a", ["A"] * 50 + ["B"] * 10), Signal("b", [0] * 3 + [1] * 57)])
+    cycles, starts = cg._columns(windows=[(20, 21), (50, 51)], margin=1)
+    assert cycles.tolist() == [19, 20, 21, -1, 49, 50, 51]
+    entries = [_selectEntry(cg._WDGetEntry(cg._entriesTree[n]), cycles, starts) for n in ["a", "b"]]
+    assert entries[0]["wave"] == "2..|22." and entries[0]["data"] == ["A", "A", "B"]
+    assert entries[1]["wave"] == "2..|2.." and entries[1]["data"] == [1, 1]
+
+    # Stable parts are collapsed
+    cycles, _ = cg._columns(overview=3)
+    assert cycles.tolist() == [0, 1, 2, 3, 4, 5, -1, 50, 51, 52]
+
+def test_saveSVGs(tmp_path):
+    chronograms = []
+    for i in range(3):
+        cg = Chronogram()
+        cg.setSignals([Signal("a", [i, 1, 2, 3])])
+        chronograms.append(cg)
+    files = [str(tmp_path / f"{i}.svg") for i in range(3)]
+    assert saveSVGs(chronograms, files, processes=2) == files
+    # Unchanged chronograms aren't rendered again
+    assert saveSVGs(chronograms, files) == []
+    chronograms[1]["a"] = Signal("a", [5, 6, 7, 8])
+    assert saveSVGs(chronograms, files) == [files[1]]
 
 
 def test_Chronogram():
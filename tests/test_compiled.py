@@ -0,0 +1,118 @@
+# Test the compiled simulation backend
+#
+# A fake compiler (a Python script) stands for clash : the "binaries" it
+# builds print the samples of the fake clashi, (0,0,Idle),(1,1,Read),...
+
+from os import chmod, environ, pathsep
+from os.path import abspath, dirname, join
+from sys import executable
+
+import pytest
+
+from clash_testbench import Testbench, Signal, Engine, CompiledClashi
+from clash_testbench.compiled import _mainSource
+
+STATES = ['Idle', 'Read', 'Write', 'Wait']
+
+BINARY = f'''#!{executable}
+import sys
+n = int(sys.argv[1])
+states = {STATES!r}
+print('[' + ','.join(f'({{j & 1}},{{j & 255}},{{states[j & 3]}})' for j in range(n)) + ']')
+'''
+
+COMPILER = f'''#!{executable}
+import os, sys
+args = sys.argv[1:]
+if args == ['--numeric-version']:
+    print('0.0.0')
+    sys.exit(0)
+with open(os.environ['FAKE_CLASH_LOG'], 'a') as log:
+    log.write(' '.join(args) + '\\n')
+output = args[args.index('-o') + 1]
+with open(output, 'w') as f:
+    f.write({BINARY!r})
+os.chmod(output, 0o755)
+'''
+
+@pytest.fixture
+def compiler(tmp_path, monkeypatch):
+    """
+    Path of the fake compiler (also available as clash in the PATH), the
+    binaries are cached in a temporary directory
+    """
+    bin = tmp_path / 'bin'
+    bin.mkdir()
+    path = bin / 'clash'
+    path.write_text(COMPILER)
+    chmod(path, 0o755)
+    monkeypatch.setenv('PATH', str(bin) + pathsep + environ['PATH'])
+    monkeypatch.setenv('CLASH_TESTBENCH_CACHE', str(tmp_path / 'cache'))
+    monkeypatch.setenv('FAKE_CLASH_LOG', str(tmp_path / 'compilations.log'))
+    return str(path)
+
+def _compilations(tmp_path):
+    log = tmp_path / 'compilations.log'
+    return len(log.read_text().splitlines()) if log.exists() else 0
+
+def test_mainSource():
+    source = _mainSource(['Top'], 'sampleN @System', 'top', 0)
+    assert 'import Top\n' in source
+    assert 'readFile' not in source
+    assert 'Prelude.print (sampleN @System (Prelude.read n :: Prelude.Int) (top ))' in source
+
+    source = _mainSource(['Top'], 'sampleN @Dom50', 'top', 1)
+    assert '  i0 <- Prelude.readFile (files Prelude.!! 0)\n' in source
+    assert '(top (fromList (Prelude.map Prelude.read (Prelude.lines i0)))))' in source
+
+    source = _mainSource(['Top', 'Other'], 'sampleN @System', 'top', 3)
+    assert 'import Top\nimport Other\n' in source
+    assert [f'i{i} <- Prelude.readFile (files Prelude.!! {i})' in source for i in range(3)] == [True] * 3
+    assert source.count('(fromList (Prelude.map Prelude.read (Prelude.lines i') == 3
+
+def test_moduleName(tmp_path):
+    for name, text in [('NoHeader.hs', 'import Clash.Prelude\n'), ('Main.hs', 'module Main where\n')]:
+        file = tmp_path / name
+        file.write_text(text)
+        with pytest.raises(ValueError):
+            CompiledClashi(str(file))
+    file = tmp_path / 'Top.hs'
+    file.write_text('-- Design\nmodule Design.Top (top) where\n')
+    assert CompiledClashi._moduleName(str(file)) == 'Design.Top'
+
+def test_binaryKey(tmp_path, compiler):
+    top = tmp_path / 'Top.hs'
+    top.write_text('module Top where\n\nimport Clash.Prelude\nimport Sub\n')
+    sub = tmp_path / 'Sub.hs'
+    sub.write_text('module Sub where\n')
+    compiled = CompiledClashi(str(top), compiler=compiler)
+
+    binary = compiled._binary('sampleN @System', 'top', 1)
+    assert _compilations(tmp_path) == 1
+    # Cached binary, the compiler isn't called
+    assert compiled._binary('sampleN @System', 'top', 1) == binary
+    assert _compilations(tmp_path) == 1
+
+    binaries = {binary}
+    binaries.add(compiled._binary('sampleN @Dom50', 'top', 1))
+    binaries.add(CompiledClashi(str(top), compiler=compiler, flags=['-O0'])._binary('sampleN @System', 'top', 1))
+    sub.write_text('module Sub where\n\nx = 1\n')
+    binaries.add(compiled._binary('sampleN @System', 'top', 1))
+    assert len(binaries) == 4
+    assert _compilations(tmp_path) == 4
+
+def test_compiledTestbench(tmp_path, compiler):
+    N = 10
+    tb = Testbench(join(dirname(abspath(__file__)), 'function.hs'), 'top', engine=Engine.COMPILED)
+    tb.setInputs([Signal('input', [i & 1 for i in range(N)])])
+    tb.setExpectedOutputs([
+        Signal('bit', [i & 1 for i in range(N)]),
+        Signal('count', list(range(N))),
+        Signal('state', [STATES[i & 3] for i in range(N)])
+    ])
+    tb.setActualOutputsNames(['bit', 'count', 'state'])
+    tb.run(seed=0)
+    assert all(checker.isValid() for checker in tb)
+    tb.run(seed=0)
+    # A single compilation for both runs
+    assert _compilations(tmp_path) == 1
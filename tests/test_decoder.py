@@ -0,0 +1,50 @@
+# Test the typed decoding of sampleN outputs
+#
+
+from clash_testbench.decoder import decodeColumn, Kind
+import numpy as np
+import pytest
+
+TOKENS = [
+    ['0', '1', '1'],
+    ['True', 'False'],
+    ['12', '-3', '0'],
+    ['0', '5'],
+    ['1.5', 'NaN', '1.0e-2', '-Infinity'],
+    ['0b0000_0101', '0b1111_1111'],
+    ['Idle', 'WaitPilot', 'Idle'],
+    ['18446744073709551616', '-1'],
+    ['Just 1', 'Nothing'],
+    ['1', '1.5'],
+]
+
+EXPECTED = [
+    (Kind.BIT, [0, 1, 1]),
+    (Kind.BOOL, [True, False]),
+    (Kind.INT, [12, -3, 0]),
+    (Kind.INT, [0, 5]),
+    (Kind.DOUBLE, [1.5, np.nan, 0.01, -np.inf]),
+    (Kind.BITVECTOR, [5, 255]),
+    (Kind.ENUM, ['Idle', 'WaitPilot', 'Idle']),
+    (Kind.INT, [18446744073709551616, -1]),
+    (Kind.RAW, ['Just 1', 'Nothing']),
+    (Kind.RAW, ['1', '1.5']),
+]
+
+@pytest.mark.parametrize("tokens, expected", list(zip(TOKENS, EXPECTED)))
+def test_decodeColumn(tokens, expected):
+    kind, values = expected
+    column = decodeColumn(tokens)
+    assert column.kind == kind
+    if kind == Kind.DOUBLE:
+        np.testing.assert_equal(column.array(), values)
+    else:
+        assert column.array().tolist() == values
+
+def test_decodeTuple():
+    column = decodeColumn(['(0.0,(A,1))', '(1.5,(B,2))'])
+    assert column.kind == Kind.TUPLE
+    assert column.values['f0'].tolist() == [0.0, 1.5]
+    assert [f.kind for f in column.fields] == [Kind.DOUBLE, Kind.TUPLE]
+    assert column.fields[1].fields[0].array().tolist() == ['A', 'B']
+    assert column.values['f1']['f1'].tolist() == [1, 2]
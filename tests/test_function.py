@@ -1,6 +1,10 @@
 
-from clash_testbench import Function
-from os.path import dirname, join
+from clash_testbench import Function, bits
+from clash_testbench.function import _matches
+import numpy as np
+from os import utime
+from os.path import dirname, getmtime, join
+import shutil
 
 
 def test_function():
@@ -11,3 +15,47 @@ def test_function():
 
 
 
+def test_functionMany():
+
+    A = Function(join(dirname(__file__), 'function.hs'), 'functionA')
+
+    assert A.testMany([1, 2, [3], 1]) == ['2', '3', '4', '2']
+
+def test_functionManyStructured():
+    # Results containing commas are kept whole, like the ones of test()
+    file = join(dirname(__file__), 'function.hs')
+    expected = {
+        'functionList' : ['[1,2]', '[2,3]'],
+        'functionVec' : ['<1,2>', '<2,3>'],
+        'functionRecord' : ['Pair {first = 1, second = 2}', 'Pair {first = 2, second = 3}']
+    }
+    for name, outputs in expected.items():
+        assert Function(file, name).testMany([1, 2]) == outputs
+        assert Function(file, name).test(1) == outputs[0]
+
+def test_memoReload(tmp_path):
+    # The results are forgotten when the source changes
+    file = str(tmp_path / 'function.hs')
+    shutil.copy(join(dirname(__file__), 'function.hs'), file)
+    A = Function(file, 'functionA')
+    assert A.testMany([1, 2]) == ['2', '3']
+    assert len(A._memo) == 2
+    mtime = getmtime(file) + 10
+    utime(file, (mtime, mtime))
+    A._checkMemo()
+    assert len(A._memo) == 0
+
+def test_checkAgainst():
+
+    A = Function(join(dirname(__file__), 'function.hs'), 'functionA')
+
+    assert A.checkAgainst(lambda x: (x + 1) % 1024, bits(10)).isValid()
+    checker = A.checkAgainst(lambda x: x, bits(10))
+    assert checker.failed == 1024
+    assert checker.counterexamples[0] == ((0,), 0, '1')
+
+def test_matches():
+    assert _matches(np.array(['1', '2', '3']), np.array([1, 2, 4])).tolist() == [True, True, False]
+    assert _matches(np.array(['Idle', 'Read']), ['Idle', 'Idle']).tolist() == [True, False]
+    assert _matches(np.array(['0.5', '1.0']), np.array([0.5, 1.5])).tolist() == [True, False]
+    assert list(bits(3, signed=True)) == [-4, -3, -2, -1, 0, 1, 2, 3]
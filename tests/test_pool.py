@@ -0,0 +1,42 @@
+# Test the clashi pool (with the fake clashi)
+#
+
+from os import utime
+from os.path import getmtime
+
+import pytest
+
+from clash_testbench import ClashiPool
+from clash_testbench.clashi import Clashi
+
+pytestmark = pytest.mark.usefixtures('fakeClashi')
+
+def test_reloadImport(tmp_path, monkeypatch):
+    # Editing a module imported by the loaded file reloads the session
+    top = tmp_path / 'Top.hs'
+    top.write_text('module Top where\n\nimport Clash.Prelude\nimport Sub\n')
+    sub = tmp_path / 'Sub.hs'
+    sub.write_text('module Sub where\n')
+    reloads = []
+    reload = Clashi.reload
+    def recordReload(self):
+        reloads.append(self)
+        reload(self)
+    monkeypatch.setattr(Clashi, 'reload', recordReload)
+
+    pool = ClashiPool(maxSessions=1)
+    try:
+        with pool.session(str(top)) as clashi:
+            assert str(sub) in clashi._mtimes
+        with pool.session(str(top)) as same:
+            assert same is clashi
+        assert reloads == []
+
+        mtime = getmtime(sub) + 10
+        utime(sub, (mtime, mtime))
+        with pool.session(str(top)) as same:
+            assert same is clashi
+        assert reloads == [clashi]
+        assert not clashi.isOutdated()
+    finally:
+        pool.close()
@@ -0,0 +1,28 @@
+# Test the profiling timers and counters
+#
+
+from clash_testbench import profiling
+
+def test_collect():
+    profiling.enable()
+    try:
+        with profiling.collect() as profile:
+            with profiling.timer('a'):
+                profiling.count('n', 3)
+            with profiling.timer('a'):
+                pass
+        report = profile.report()
+        assert report['timers']['a']['count'] == 2
+        assert report['counters'] == {'n' : 3}
+        # Nothing is measured outside of the block
+        with profiling.timer('b'):
+            pass
+        assert 'b' not in profile.report()['timers']
+    finally:
+        profiling.disable()
+
+def test_disabled():
+    with profiling.collect() as profile:
+        with profiling.timer('a'):
+            profiling.count('n')
+    assert profile.report() == {'timers' : {}, 'counters' : {}}
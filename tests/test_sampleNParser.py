@@ -1,7 +1,7 @@
 # Test the SampleN parser
 #
 
-from clash_testbench.clashi import Clashi
+from clash_testbench.clashi import Clashi, SampleNJob, _SampleNTokenizer, _SampleNDemux, _OutputFilter
 import pytest
 
 SINGLE_VALUE = [False, False, True]
@@ -31,3 +31,48 @@ def test_sampleNParser(singleValue, data, expectedData):
     output = clashi._sampleNParser(data, singleValue)
 
     assert expectedData == output
+
+@pytest.mark.parametrize("singleValue, data, expectedData", zip(SINGLE_VALUE, DATA, EXPECTED_DATA))
+def test_sampleNTokenizerChunks(singleValue, data, expectedData):
+    # The output must be the same wherever the chunks are split
+    for chunkSize in [1, 2, 3, 7, len(data)]:
+        tokenizer = _SampleNTokenizer(singleValue)
+        for i in range(0, len(data), chunkSize):
+            tokenizer.feed(data[i:i+chunkSize])
+        assert expectedData == tokenizer.close()
+
+def test_sampleNDemux():
+    # Lists printed one after the other by sampleNMany, split anywhere
+    data = '\r\n'.join(DATA) + '\r\n'
+    for chunkSize in [1, 2, 3, 7, len(data)]:
+        demux = _SampleNDemux(SINGLE_VALUE)
+        for i in range(0, len(data), chunkSize):
+            demux.feed(data[i:i+chunkSize])
+        assert [[a.tolist() for a in arrays] for arrays in demux.arrays()] == EXPECTED_DATA
+
+    # Missing list
+    demux = _SampleNDemux(SINGLE_VALUE)
+    demux.feed('\r\n'.join(DATA[:2]))
+    with pytest.raises(ValueError):
+        demux.arrays()
+
+def test_sampleNJob():
+    assert SampleNJob(4, 'top', '(fromList [1,2])', domain='Dom50')._command() == 'Prelude.print (sampleN @Dom50 4 (top (fromList [1,2])))'
+    assert 'sampleN @System 4 (top (fromList' in SampleNJob(4, 'top', files=['a.txt'])._command()
+
+RAW_OUTPUT = ' functionA 1\r\n2\r\n\x1b[?1l\x1b>clashi> '
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, len(RAW_OUTPUT)])
+def test_outputFilterChunks(size):
+    outputFilter = _OutputFilter()
+    output = ''.join(outputFilter.feed(RAW_OUTPUT[i:i+size]) for i in range(0, len(RAW_OUTPUT), size))
+    assert outputFilter.done
+    assert outputFilter.error is None
+    assert output == '2\r\n\n'
+
+def test_outputFilterError():
+    outputFilter = _OutputFilter()
+    outputFilter.feed(' bogus\r\n<interactive>:1:1: err')
+    assert outputFilter.feed('or: not in scope\r\n\x1b>clashi> ') == ''
+    assert outputFilter.done
+    assert 'error: not in scope' in outputFilter.errorMessage()
@@ -0,0 +1,76 @@
+# Test the array representation of signals
+#
+
+from clash_testbench import Signal
+from clash_testbench.logic import Level, Sample, Unknown
+import numpy as np
+from clash_testbench.testbench import SignalChecker, WindowedSignalChecker
+
+def test_values():
+    s = Signal("s", [0, 1, Level.HIGH, Level.LOW, 'A', 5])
+    assert s.values() == [0, 1, 1, 0, 'A', 5]
+    assert [x._value for x in s] == [0, 1, Level.HIGH, Level.LOW, 'A', 5]
+
+def test_setitem():
+    s = Signal("s", [0, 1, 2, 3])
+    s[0] = 'A'
+    s[1:3] = Level.UNKNOWN
+    s[3] = Level.HIGH
+    assert [x._value for x in s] == ['A', Level.UNKNOWN, Level.UNKNOWN, Level.HIGH]
+
+def test_copy():
+    s = Signal("s", [0, 1, 2])
+    c = s.copy()
+    c[0] = 5
+    s[1] = 6
+    assert s.values() == [0, 6, 2]
+    assert c.values() == [5, 1, 2]
+
+def test_fit():
+    s = Signal("s", ['Idle'])
+    s.fit(4)
+    assert s.values() == ['Idle'] * 4
+    s[1] = 'Read'
+    assert s.values() == ['Idle', 'Read', 'Idle', 'Idle']
+
+def test_iadd():
+    s = Signal("s")
+    s += [0, 1]
+    s += Sample('A', colorIndex=2)
+    assert s.values() == [0, 1, 'A']
+    assert s[2].colorIndex == 2
+
+def test_signalChecker():
+    expected = Signal("e", [0, 1, Level.UNKNOWN, 'A', '5', 5, Level.HIGH, 'B', 'B'])
+    actual = Signal("a", ['0', '1', 'X', 'A', 5, 6, 1, 'C', 'C'])
+    checker = SignalChecker(expected, actual)
+    assert checker.valid_list.tolist() == [True] * 5 + [False, True, False, False]
+    assert not checker.isValid()
+    assert checker.firstMismatch() == 5
+    assert checker.mismatchRanges() == [(5, 6), (7, 9)]
+
+def test_unknown():
+    s = Signal("s", [Level.UNKNOWN] * 64 + [1])
+    assert s.values(Unknown.ZERO) == [0] * 64 + [1]
+    assert s.values(Unknown.ONE) == [1] * 65
+    a = s.values(Unknown.RANDOM, np.random.default_rng(1234))
+    b = s.values(Unknown.RANDOM, np.random.default_rng(1234))
+    assert a == b
+    assert set(a) == {0, 1}
+
+def test_window():
+    s = Signal("s", [0, 1, 'A', 'B'])
+    w = s.window(1, 3)
+    assert w.values() == [1, 'A']
+    w[0] = 'C'
+    assert s.values() == [0, 1, 'A', 'B']
+
+def test_windowedSignalChecker():
+    expected = Signal("e", [0, 0, 0, 1, 1, 1, 0, 0])
+    actual = Signal("a", [0, 0, 1, 0, 1, 1, 0, 1])
+    checker = WindowedSignalChecker("a", True)
+    for start in range(0, 8, 3):
+        checker.add(SignalChecker(expected.window(start, start + 3), actual.window(start, start + 3)), start)
+    assert checker.mismatchRanges() == SignalChecker(expected, actual).mismatchRanges() == [(2, 4), (7, 8)]
+    assert checker.firstMismatch() == 2
+    assert not checker.isValid()
@@ -0,0 +1,97 @@
+# Test the testbench runs
+#
+# The runs use the fake clashi of the benchmarks (benchmarks/fake_clashi.py),
+# whose outputs are (Bit, Unsigned, state) samples : (0,0,Idle),(1,1,Read),...
+
+from os.path import abspath, dirname, join
+
+import pytest
+
+from clash_testbench import Testbench, Signal, Stimulus, ClashiPool, runMany, runBatch, loadTrace
+
+FILE = join(dirname(abspath(__file__)), 'function.hs')
+STATES = ['Idle', 'Read', 'Write', 'Wait']
+
+pytestmark = pytest.mark.usefixtures('fakeClashi')
+
+@pytest.fixture
+def pool():
+    pool = ClashiPool(maxSessions=1)
+    yield pool
+    pool.close()
+
+def _testbench(cycles, pool, entity='top', **kwargs):
+    tb = Testbench(FILE, entity, pool=pool, **kwargs)
+    tb.setInputs([Signal('input', [i & 1 for i in range(cycles)])])
+    tb.setExpectedOutputs([
+        Signal('bit', [i & 1 for i in range(cycles)]),
+        Signal('count', [i & 255 for i in range(cycles)]),
+        Signal('state', [STATES[i & 3] for i in range(cycles)])
+    ])
+    tb.setActualOutputsNames(['bit', 'count', 'state'])
+    return tb
+
+def test_runMany(pool):
+    results = runMany([_testbench(n, pool) for n in [3, 5, 7]], workers=3)
+    assert [len(checkers[0]._actual) for checkers in results] == [3, 5, 7]
+    assert all(c.isValid() for checkers in results for c in checkers)
+    # The limit of the (shared) pool is only raised during the call
+    assert pool.maxSessions == 1
+    assert len(pool) == 1
+
+@pytest.mark.parametrize('stimulus', [Stimulus.LIST, Stimulus.FILE])
+def test_runBatch(pool, monkeypatch, stimulus):
+    # Entities of the same file in different domains, simulated by a single command
+    testbenches = [
+        _testbench(5, pool),
+        _testbench(3, pool, entity='other', domain='Dom50'),
+        _testbench(7, pool, domain='Dom50')
+    ]
+    from clash_testbench.clashi import Clashi
+    commands = []
+    runCommandStream = Clashi._runCommandStream
+    def recordCommand(self, command, consumer, timeout = -1):
+        commands.append(command)
+        return runCommandStream(self, command, consumer, timeout)
+    monkeypatch.setattr(Clashi, '_runCommandStream', recordCommand)
+    results = runBatch(testbenches, stimulus=stimulus)
+    commands = [c for c in commands if 'sampleN' in c]
+    assert len(commands) == 1
+    assert 'sampleN @System 5 (top ' in commands[0]
+    assert 'sampleN @Dom50 3 (other ' in commands[0]
+    assert 'sampleN @Dom50 7 (top ' in commands[0]
+    # Results in submission order
+    assert [len(checkers[0]._actual) for checkers in results] == [5, 3, 7]
+    assert [checkers for checkers in results] == [tb._pairs for tb in testbenches]
+    assert all(c.isValid() for checkers in results for c in checkers)
+
+def test_runWindowedError(pool, monkeypatch):
+    # An error while stopping the simulation doesn't hide the error of the window
+    from clash_testbench.clashi import Clashi
+    def sampleNext(self, N, singleOutput):
+        raise ValueError("window")
+    def stopSimulation(self):
+        raise RuntimeError("stop")
+    monkeypatch.setattr(Clashi, 'sampleNext', sampleNext)
+    monkeypatch.setattr(Clashi, 'stopSimulation', stopSimulation)
+    with pytest.raises(ValueError, match='window'):
+        _testbench(10, pool).runWindowed(4)
+
+@pytest.mark.parametrize('extension', ['.trace', '.vcd'])
+def test_runWindowedPartialTrace(pool, monkeypatch, tmp_path, extension):
+    # The trace of the windows read before an error is kept
+    from clash_testbench import readVCD
+    from clash_testbench.clashi import Clashi
+    sampleNext = Clashi.sampleNext
+    calls = []
+    def failingSampleNext(self, N, singleOutput):
+        calls.append(N)
+        if len(calls) > 1:
+            raise ValueError("window")
+        return sampleNext(self, N, singleOutput)
+    monkeypatch.setattr(Clashi, 'sampleNext', failingSampleNext)
+    trace = str(tmp_path / ('outputs' + extension))
+    with pytest.raises(ValueError, match='window'):
+        _testbench(10, pool).runWindowed(4, trace=trace)
+    signals = loadTrace(trace) if extension == '.trace' else readVCD(trace)
+    assert [s.values() for s in signals.values()] == [[0, 1, 0, 1], [0, 1, 2, 3], STATES]